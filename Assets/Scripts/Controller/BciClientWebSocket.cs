@@ -13,10 +13,20 @@ public class VAData
     public float valence;
     public float arousal;
     public string version;
+    public string session_id;
+    public uint version_id;   // binary frames carry crc32(version) instead of the string
 }
 
 public class BciClientWebSocket : MonoBehaviour
 {
+    // 与 online/src/wire.py 保持一致
+    private const string BinarySubprotocol = "va.binary.v1";
+    private const int BinaryHeaderSize = 25;
+
+    public string serverUri = "ws://localhost:8765/ws";
+    [Tooltip("Request the compact binary VA frame instead of JSON")]
+    public bool binaryFrames = true;
+
     private ClientWebSocket _ws;
     private CancellationTokenSource _cts = new CancellationTokenSource();
     private ConcurrentQueue<VAData> _queue = new ConcurrentQueue<VAData>();
@@ -27,7 +37,9 @@ public class BciClientWebSocket : MonoBehaviour
     async void Start()
     {
         _ws = new ClientWebSocket();
-        var uri = new Uri("ws://localhost:8765");
+        if (binaryFrames)
+            _ws.Options.AddSubProtocol(BinarySubprotocol);
+        var uri = new Uri(serverUri);
 
         try
         {
@@ -61,6 +73,12 @@ public class BciClientWebSocket : MonoBehaviour
                     var data = JsonUtility.FromJson<VAData>(msg);
                     _queue.Enqueue(data);
                 }
+                else if (result.MessageType == WebSocketMessageType.Binary)
+                {
+                    var data = DecodeFrame(buffer, result.Count);
+                    if (data != null)
+                        _queue.Enqueue(data);
+                }
             }
             catch (Exception ex)
             {
@@ -70,6 +88,27 @@ public class BciClientWebSocket : MonoBehaviour
         }
     }
 
+    // Little-endian frame: "VA", format 1, flags, f64 ts, f32 valence,
+    // f32 arousal, u32 version id, u8 session id length, UTF-8 session id
+    private static VAData DecodeFrame(byte[] buf, int count)
+    {
+        if (count < BinaryHeaderSize || buf[0] != (byte)'V' || buf[1] != (byte)'A' || buf[2] != 1
+            || !BitConverter.IsLittleEndian)
+        {
+            Debug.LogWarning("⚠️ Unrecognized binary frame");
+            return null;
+        }
+        int n = Math.Min(buf[24], count - BinaryHeaderSize);
+        return new VAData
+        {
+            ts = BitConverter.ToDouble(buf, 4),
+            valence = BitConverter.ToSingle(buf, 12),
+            arousal = BitConverter.ToSingle(buf, 16),
+            version_id = BitConverter.ToUInt32(buf, 20),
+            session_id = Encoding.UTF8.GetString(buf, BinaryHeaderSize, n)
+        };
+    }
+
     void Update()
     {
         while (_queue.TryDequeue(out var data))
@@ -3,7 +3,9 @@ import torch
 from torch.utils.data import Dataset
 
 class EEGWindowSet(Dataset):
-    def __init__(self, npz_dir):
+    # spec_channels=1 keeps one plane of 3-channel files (they are copies)
+    def __init__(self, npz_dir, spec_channels=None):
+        self.spec_channels = spec_channels
         self.items = []
         for f in glob.glob(f'{npz_dir}/*.npz'):
             arr = np.load(f)
@@ -15,6 +17,8 @@ class EEGWindowSet(Dataset):
         f,i = self.items[idx]
         arr = np.load(f)
         spec = torch.from_numpy(arr['spec'][i])
+        if self.spec_channels and spec.shape[0] != self.spec_channels:
+            spec = spec[:1].expand(self.spec_channels, -1, -1)
         de   = torch.from_numpy(arr['de'][i])
         y    = torch.from_numpy(arr['y'][i]).float()
         return spec, de, y
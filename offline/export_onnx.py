@@ -1,11 +1,20 @@
 import argparse, sys, torch
 import torch.nn.utils.prune as prune
-from model_cnn_tcn import EmotionNet
+from model_cnn_tcn import EmotionNet, fold_spec_channels
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument('--ckpt', default='ckpt/ckpt.pt')
     p.add_argument('--out',  default='emotion_va.onnx')
+    p.add_argument('--prune', type=float, default=0.1,
+                   help='l1_unstructured amount (only shrinks weights, not dense latency); 0 disables')
+    p.add_argument('--quantize', action='store_true',
+                   help='also write INT8 dynamic/static variants and a latency/CCC report')
+    p.add_argument('--data', default='../data/windows_5s', help='npz windows for INT8 calibration')
+    p.add_argument('--spec-channels', type=int, default=3, choices=(1, 3),
+                   help='1 folds the 3 identical spectrogram planes into the first conv')
+    p.add_argument('--spec-size', default='224x224',
+                   help='HxW spectrogram input, or "native" for the STFT resolution (dynamic H/W)')
     return p.parse_args()
 
 if __name__=='__main__':
@@ -16,20 +25,36 @@ if __name__=='__main__':
         print("Please install onnx: pip install onnx", file=sys.stderr)
         sys.exit(1)
 
-    model = EmotionNet()
-    model.load_state_dict(torch.load(args.ckpt, map_location='cpu'))
+    model = EmotionNet(args.spec_channels)
+    state = torch.load(args.ckpt, map_location='cpu')
+    model.load_state_dict(fold_spec_channels(state, args.spec_channels))
     model.eval()
 
-    for m in model.modules():
-        if isinstance(m, (torch.nn.Conv2d, torch.nn.Linear)):
-            prune.l1_unstructured(m, 'weight', amount=0.1)
-            prune.remove(m, 'weight')
+    if args.prune > 0:
+        for m in model.modules():
+            if isinstance(m, (torch.nn.Conv2d, torch.nn.Linear)):
+                prune.l1_unstructured(m, 'weight', amount=args.prune)
+                prune.remove(m, 'weight')
 
-    dummy_spec = torch.randn(1,3,224,224)
+    native = args.spec_size == 'native'
+    h, w = (33, 21) if native else map(int, args.spec_size.split('x'))
+    dummy_spec = torch.randn(1,args.spec_channels,h,w)
     dummy_de   = torch.randn(1,26)
+    # dynamic batch so the online backend can batch several sessions
+    spec_axes = {0: 'batch', 2: 'freq', 3: 'time'} if native else {0: 'batch'}
     torch.onnx.export(
         model, (dummy_spec, dummy_de), args.out,
         input_names=['spec','de'], output_names=['va'],
-        opset_version=12, do_constant_folding=True
+        dynamic_axes={'spec': spec_axes, 'de': {0: 'batch'}, 'va': {0: 'batch'}},
+        opset_version=13, do_constant_folding=True
     )
-    print(f"ONNX exported to {args.out}")
+    # Input contract read by the online ONNXRunner to build matching features
+    m = onnx.load(args.out)
+    onnx.helper.set_model_props(m, {'spec_channels': str(args.spec_channels),
+                                    'spec_size': 'native' if native else f'{h}x{w}'})
+    onnx.save(m, args.out)
+    print(f"ONNX exported to {args.out} (spec {args.spec_channels}x{args.spec_size})")
+
+    if args.quantize:
+        from quantize import quantize_variants
+        quantize_variants(args.out, args.data)
@@ -1,9 +1,9 @@
 import torch, torch.nn as nn
 
 class SpecBranch(nn.Sequential):
-    def __init__(self):
+    def __init__(self, in_ch=3):
         super().__init__(
-            nn.Conv2d(3,16,3,padding=1), nn.ReLU(),
+            nn.Conv2d(in_ch,16,3,padding=1), nn.ReLU(),
             nn.MaxPool2d(2),
             nn.Conv2d(16,32,3,padding=1), nn.ReLU(),
             nn.AdaptiveAvgPool2d((1,1))
@@ -31,11 +31,22 @@ class TCNHead(nn.Sequential):
     def forward(self,x): return super().forward(x.unsqueeze(-1))
 
 class EmotionNet(nn.Module):
-    def __init__(self):
+    # spec_channels=1 takes the single spectrogram plane instead of 3 copies;
+    # the pooling makes the spectrogram branch independent of its resolution
+    def __init__(self, spec_channels=3):
         super().__init__()
-        self.spec = SpecBranch()
+        self.spec = SpecBranch(spec_channels)
         self.de   = DEBranch()
         self.head = TCNHead()
     def forward(self, spec, de):
         f = torch.cat([self.spec(spec), self.de(de)], dim=1)
         return self.head(f)
+
+def fold_spec_channels(state_dict, channels=1):
+    # The 3 spectrogram planes are identical copies, so a first conv trained on
+    # them equals one whose weights are summed over the input channels
+    w = state_dict['spec.0.weight']
+    if w.shape[1] != channels:
+        state_dict = dict(state_dict)
+        state_dict['spec.0.weight'] = w.sum(dim=1, keepdim=True).repeat(1, channels, 1, 1) / channels
+    return state_dict
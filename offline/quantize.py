@@ -0,0 +1,148 @@
+import argparse, glob, json, os, time
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                      quantize_dynamic, quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from scipy.ndimage import zoom
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument('--model', required=True, help='fp32 ONNX model')
+    p.add_argument('--data', default='../data/windows_5s', help='npz windows for calibration/eval')
+    p.add_argument('--calib', type=int, default=64, help='windows used for static calibration')
+    p.add_argument('--runs', type=int, default=200, help='timed runs per variant')
+    p.add_argument('--tolerance', type=float, default=0.02, help='max CCC drop vs fp32')
+    p.add_argument('--report', default=None, help='JSON report path (default: <model>.quant.json)')
+    return p.parse_args()
+
+
+def input_shapes(path):
+    sess = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+    return {i.name: i.shape for i in sess.get_inputs()}
+
+
+def load_windows(npz_dir, spec_shape):
+    # Stack every window; spectrograms are resized (zoom, order=1, as online)
+    # when the stored resolution differs from the model input, and 3-plane
+    # files feed single-channel models their first (identical) plane
+    specs, des, ys = [], [], []
+    for f in sorted(glob.glob(f'{npz_dir}/*.npz')):
+        arr = np.load(f)
+        specs.append(arr['spec']); des.append(arr['de']); ys.append(arr['y'])
+    spec, de, y = np.concatenate(specs), np.concatenate(des), np.concatenate(ys)
+    c = spec_shape[1]
+    if isinstance(c, int) and spec.shape[1] != c:
+        spec = np.repeat(spec[:, :1], c, axis=1)
+    h, w = spec_shape[-2:]
+    if isinstance(h, int) and spec.shape[-2:] != (h, w):
+        f = (1, 1, h / spec.shape[-2], w / spec.shape[-1])
+        spec = zoom(spec, f, order=1)
+    return spec.astype('float32'), de.astype('float32'), y.astype('float32')
+
+
+def prepare(model, path, opset=13):
+    # Per-channel QDQ needs DequantizeLinear(axis), i.e. opset >= 13; then run
+    # the shape inference / graph cleanup recommended before quantization
+    m = onnx.load(model)
+    if m.opset_import[0].version < opset:
+        m = onnx.version_converter.convert_version(m, opset)
+    onnx.save(m, path)
+    quant_pre_process(path, path, skip_symbolic_shape=True)
+    return path
+
+
+class WindowReader(CalibrationDataReader):
+    def __init__(self, names, spec, de):
+        self.names = names
+        self.items = iter(range(len(spec)))
+        self.spec, self.de = spec, de
+    def get_next(self):
+        i = next(self.items, None)
+        if i is None: return None
+        return {self.names[0]: self.spec[i:i+1], self.names[1]: self.de[i:i+1]}
+
+
+def ccc(pred, gold):
+    # Concordance correlation coefficient per output column
+    mp, mg = pred.mean(0), gold.mean(0)
+    vp, vg = pred.var(0), gold.var(0)
+    cov = ((pred - mp) * (gold - mg)).mean(0)
+    return 2 * cov / (vp + vg + (mp - mg) ** 2 + 1e-8)
+
+
+def evaluate(path, spec, de, y, runs):
+    sess = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+    names = [i.name for i in sess.get_inputs()]
+    out_name = sess.get_outputs()[0].name
+    preds = np.concatenate([
+        sess.run([out_name], {names[0]: spec[i:i+1], names[1]: de[i:i+1]})[0]
+        for i in range(len(spec))
+    ])
+    lat = []
+    for k in range(runs):
+        i = k % len(spec)
+        t = time.perf_counter()
+        sess.run([out_name], {names[0]: spec[i:i+1], names[1]: de[i:i+1]})
+        lat.append((time.perf_counter() - t) * 1e3)
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+    return preds, {'latency_ms': {'p50': p50, 'p90': p90, 'p99': p99},
+                   'ccc': dict(zip(['valence', 'arousal'], ccc(preds, y).tolist())),
+                   'size_kb': os.path.getsize(path) / 1024}
+
+
+def quantize_variants(model, data, calib=64, runs=200, tolerance=0.02, report=None):
+    # Write <model>.int8-dynamic.onnx and <model>.int8-static.onnx next to the
+    # fp32 model and report latency and CCC of each against fp32
+    base = os.path.splitext(model)[0]
+    shapes = input_shapes(model)
+    names = list(shapes)
+    spec, de, y = load_windows(data, shapes[names[0]])
+    print(f"{len(spec)} windows from {data}")
+
+    variants = {'fp32': model,
+                'int8-dynamic': base + '.int8-dynamic.onnx',
+                'int8-static': base + '.int8-static.onnx'}
+    src = prepare(model, base + '.prep.onnx')
+    quantize_dynamic(src, variants['int8-dynamic'], weight_type=QuantType.QInt8)
+    idx = np.random.default_rng(0).permutation(len(spec))[:calib]
+    quantize_static(src, variants['int8-static'], WindowReader(names, spec[idx], de[idx]),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    os.remove(src)
+
+    results, ref = {}, None
+    for name, path in variants.items():
+        preds, res = evaluate(path, spec, de, y, runs)
+        if ref is None: ref = preds
+        res['path'] = path
+        res['max_abs_diff_vs_fp32'] = float(np.abs(preds - ref).max())
+        results[name] = res
+    fp = results['fp32']['ccc']
+    for res in results.values():
+        res['ccc_delta'] = {k: res['ccc'][k] - fp[k] for k in fp}
+        res['within_tolerance'] = all(d >= -tolerance for d in res['ccc_delta'].values())
+    ok = [n for n, r in results.items() if r['within_tolerance']]
+    best = min(ok, key=lambda n: results[n]['latency_ms']['p50'])
+
+    print(f"{'variant':14s} {'p50':>7s} {'p90':>7s} {'p99':>7s}  {'dCCC val':>9s} {'dCCC aro':>9s}  size")
+    for name, r in results.items():
+        lat, d = r['latency_ms'], r['ccc_delta']
+        print(f"{name:14s} {lat['p50']:7.2f} {lat['p90']:7.2f} {lat['p99']:7.2f}  "
+              f"{d['valence']:+9.4f} {d['arousal']:+9.4f}  {r['size_kb']:.0f} KB"
+              f"{'' if r['within_tolerance'] else '  (over tolerance)'}")
+    print(f"Fastest within tolerance ({tolerance}): {best}")
+
+    report = report or base + '.quant.json'
+    with open(report, 'w') as f:
+        json.dump({'windows': len(spec), 'tolerance': tolerance, 'recommended': best,
+                   'variants': results}, f, indent=2)
+    print(f"Report written to {report}")
+    return results
+
+
+if __name__=='__main__':
+    args = parse_args()
+    quantize_variants(args.model, args.data, args.calib, args.runs, args.tolerance, args.report)
@@ -11,9 +11,9 @@ def ccc(pred, gold):
 
 def train(args):
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    ds = EEGWindowSet(args.data)
+    ds = EEGWindowSet(args.data, args.spec_channels)
     dl = DataLoader(ds, batch_size=32, shuffle=True, num_workers=4)
-    net = EmotionNet().to(device)
+    net = EmotionNet(args.spec_channels).to(device)
     opt = optim.Adam(net.parameters(), lr=1e-3)
     os.makedirs(args.out, exist_ok=True)
     best = float('inf')
@@ -38,5 +38,6 @@ if __name__=='__main__':
     p.add_argument('--data',   required=True)
     p.add_argument('--out',    default='ckpt')
     p.add_argument('--epochs', type=int, default=30)
+    p.add_argument('--spec-channels', type=int, default=3, choices=(1, 3))
     args = p.parse_args()
     train(args)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# online/benchmarks/bench_pipeline.py
+"""
+Benchmark the online hot path on synthetic EEG and a stand-in model.
+
+Data is 62-channel Gaussian noise at 256 Hz with the window/hop of
+config/runtime.yaml; the model is generated by standin_model.py, so no
+LSL stream, recording or trained model is needed. Stages:
+
+    ring_extend          RingBuffer.extend of one LSL chunk
+    ring_get             RingBuffer.get of one window
+    preprocess_transform Preprocessor.transform (window mode)
+    preprocess_update    Preprocessor.update of one hop (stream mode)
+    extract_feats        extract_feats on a filtered window
+    onnx_predict         ONNXRunner.predict, batch of one
+    hop_window           one infer_loop hop in window mode: FeatureStage,
+                         predict and publish() (no clients connected)
+    hop_stream           the same in stream mode
+
+Run from online/ (pip install -r requirements-dev.txt for onnx):
+
+    python -m benchmarks.bench_pipeline                   # compare with baseline.json
+    python -m benchmarks.bench_pipeline --update-baseline # record a new baseline
+
+The median time of every stage is compared with the baseline; the run
+exits with status 1 when a stage is slower by more than the threshold
+(per-stage values in the baseline's "thresholds_pct" override
+--threshold). A stage over its threshold is measured once more before it
+counts as a regression. --update-baseline runs the suite --repeat times,
+stores the median of the runs and, per stage, how far the slowest run
+lies above it ("spread_pct"); a stage's threshold is set above that
+spread so that machine noise alone does not fail the gate. Baselines are
+machine specific: record one on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import onnxruntime as ort
+import yaml
+
+from benchmarks.standin_model import make_standin_model
+from src import api_rest
+from src.main import publish
+from src.mqtt_publisher import MQTTPublisher
+from src.onnx_runner import ONNXRunner
+from src.pipeline import FeatureStage
+from src.preprocess import Preprocessor, extract_feats
+from src.utils.ring_buffer import RingBuffer
+from src.websocket_server import WebSocketServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, 'baseline.json')
+N_CHANNELS = 62
+FS = 256
+CHUNK = 16
+
+
+def measure(fn, number, warmup=10, rounds=5):
+    """
+    Per-call times (seconds) of `number` calls after `warmup` calls, split
+    into `rounds`; the round with the lowest median is kept (as timeit
+    keeps the best repeat), which filters out bursts of machine noise.
+    """
+    for _ in range(warmup):
+        fn()
+    times = np.empty((rounds, max(number // rounds, 1)))
+    for r in range(rounds):
+        for i in range(times.shape[1]):
+            t = time.perf_counter()
+            fn()
+            times[r, i] = time.perf_counter() - t
+    return times[np.argmin(np.median(times, axis=1))]
+
+
+class _Quiet:
+    def info(self, *a, **k): pass
+    warning = error = debug = info
+
+
+_QUIET = _Quiet()
+
+
+class _Session:
+    def __init__(self, ring, cfg):
+        self.id = 'bench'
+        self.ring = ring
+        self.features = FeatureStage(ring, cfg, _QUIET, n_buffers=2)
+
+
+def run(cfg, number, model_path, only=None):
+    """{stage: per-call times}; `only` limits the run to these stages."""
+    def want(stage):
+        return only is None or stage in only
+
+    rng = np.random.default_rng(0)
+    length = int(FS * cfg['window_size'])
+    hop = int(FS * cfg['step_size'])
+    low, high = cfg['bandpass']['low'], cfg['bandpass']['high']
+    data = rng.standard_normal((length * 4, N_CHANNELS)).astype(np.float32)
+    window = data[:length].astype(np.float64)
+    results = {}
+
+    ring = RingBuffer(length * 2, N_CHANNELS)
+    chunk = data[:CHUNK]
+    if want('ring_extend'):
+        results['ring_extend'] = measure(lambda: ring.extend(chunk), number * 10)
+    if want('ring_get'):
+        results['ring_get'] = measure(lambda: ring.get(length), number * 10)
+
+    pre = Preprocessor(FS, low, high)
+    if want('preprocess_transform'):
+        results['preprocess_transform'] = measure(lambda: pre.transform(window), number)
+    if want('preprocess_update'):
+        stream_pre = Preprocessor(FS, low, high, window=length)
+        stream_pre.update(window)
+        new = window[:hop]
+        results['preprocess_update'] = measure(lambda: stream_pre.update(new), number)
+
+    if want('extract_feats'):
+        filtered = pre.transform(window).T
+        out = np.empty((3, 224, 224), dtype=np.float32)
+        results['extract_feats'] = measure(lambda: extract_feats(filtered, FS, out=out), number)
+
+    runner = ONNXRunner(model_path, cfg.get('onnx'))
+    if want('onnx_predict'):
+        spec = rng.standard_normal((1, 3, 224, 224)).astype(np.float32)
+        de = rng.standard_normal((1, 26)).astype(np.float32)
+        results['onnx_predict'] = measure(lambda: runner.predict(spec, de), number)
+
+    # One infer_loop hop without acquisition: features, inference, publish
+    loop = asyncio.new_event_loop()
+    ws = WebSocketServer('127.0.0.1', 0, _QUIET, frontend_uri='')
+    mqtt = MQTTPublisher('', 0, '', _QUIET)
+    for mode in ('window', 'stream'):
+        if not want(f'hop_{mode}'):
+            continue
+        hop_cfg = dict(cfg, sampling_rate=FS, version='bench', preprocess={'mode': mode})
+        hop_ring = RingBuffer(length * 2, N_CHANNELS)
+        session = _Session(hop_ring, hop_cfg)
+        feed = iter(np.tile(data, (number * 2 * hop // len(data) + 2, 1)).reshape(-1, hop, N_CHANNELS))
+        hop_ring.extend(data[:length])
+
+        def one_hop():
+            hop_ring.extend(next(feed))
+            spec3, de_vec = session.features(hop_ring.seq)
+            pred = runner.predict(spec3, de_vec)
+            loop.run_until_complete(publish(hop_cfg, _QUIET, ws, mqtt, session.id, pred[0].copy()))
+        results[f'hop_{mode}'] = measure(one_hop, number)
+    loop.close()
+    return results
+
+
+def summarize(times):
+    return {'median_us': float(np.median(times) * 1e6),
+            'p90_us': float(np.percentile(times, 90) * 1e6),
+            'n': int(len(times))}
+
+
+def combine(runs):
+    """
+    Merge the summaries of repeated runs: the median of their medians, and
+    as `spread_pct` how far the slowest run lies above it, i.e. the change
+    a comparison would have reported for that run without any code change.
+    """
+    stages = {}
+    for stage in runs[0]:
+        medians = [r[stage]['median_us'] for r in runs]
+        median = float(np.median(medians))
+        stages[stage] = {'median_us': median,
+                         'p90_us': float(np.median([r[stage]['p90_us'] for r in runs])),
+                         'n': int(sum(r[stage]['n'] for r in runs)),
+                         'spread_pct': float(100.0 * (max(medians) / median - 1.0))}
+    return stages
+
+
+def noise_thresholds(stages, threshold, margin=1.5, step=5.0):
+    """Per-stage thresholds: `margin` x the stage's spread_pct, at least `threshold`."""
+    return {stage: max(threshold, float(np.ceil(res['spread_pct'] * margin / step) * step))
+            for stage, res in stages.items()}
+
+
+def compare(current, baseline, threshold):
+    """Return [(stage, current_us, baseline_us, change_pct, limit_pct)] of regressions, and the table."""
+    limits = baseline.get('thresholds_pct', {})
+    rows, regressions = [], []
+    for stage, res in current.items():
+        ref = baseline.get('stages', {}).get(stage)
+        if ref is None:
+            rows.append((stage, res['median_us'], None, None, None))
+            continue
+        change = 100.0 * (res['median_us'] / ref['median_us'] - 1.0)
+        limit = limits.get(stage, threshold)
+        rows.append((stage, res['median_us'], ref['median_us'], change, limit))
+        if change > limit:
+            regressions.append(rows[-1])
+    return regressions, rows
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'onnxruntime': ort.__version__, 'machine': platform.machine(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--config', default='config/runtime.yaml')
+    p.add_argument('--number', type=int, default=200, help='timed calls per stage')
+    p.add_argument('--baseline', default=BASELINE)
+    p.add_argument('--threshold', type=float, default=25.0,
+                   help='allowed slowdown of a stage median vs baseline, in percent')
+    p.add_argument('--out', default=None, help='also write this run as JSON here')
+    p.add_argument('--update-baseline', action='store_true', help='write this run as the new baseline')
+    p.add_argument('--model', default=None, help='ONNX model to time (default: generated stand-in)')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='runs of the suite recorded by --update-baseline (their spread sets the thresholds)')
+    args = p.parse_args()
+
+    with open(args.config) as f:
+        cfg = yaml.safe_load(f)
+    cfg['onnx'] = dict(cfg.get('onnx') or {}, optimized_model_path=None)
+    api_rest.HISTORY_CAPACITY = 1024
+
+    update = args.update_baseline or not os.path.exists(args.baseline)
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        model = args.model or make_standin_model(os.path.join(tmp, 'standin.onnx'))
+
+        def suite(only=None):
+            return {k: summarize(v) for k, v in run(cfg, args.number, model, only).items()}
+
+        if update:
+            stages = combine([suite() for _ in range(max(args.repeat, 1))])
+        else:
+            stages = suite()
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            regressions, rows = compare(stages, baseline, args.threshold)
+            if regressions:
+                # One slow measurement may be noise: time those stages again
+                # and keep the faster of the two
+                for stage, res in suite({stage for stage, *_ in regressions}).items():
+                    if res['median_us'] < stages[stage]['median_us']:
+                        stages[stage] = res
+                regressions, rows = compare(stages, baseline, args.threshold)
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+              'config': {'fs': FS, 'n_channels': N_CHANNELS, 'window_size': cfg['window_size'],
+                         'step_size': cfg['step_size'], 'number': args.number,
+                         'model': 'standin' if args.model is None else os.path.basename(args.model)},
+              'stages': stages}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if update:
+        report['config']['repeat'] = args.repeat
+        report['thresholds_pct'] = noise_thresholds(stages, args.threshold)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        for stage, res in stages.items():
+            print(f"{stage:22s} {res['median_us']:10.1f} us  (p90 {res['p90_us']:.1f}, "
+                  f"spread {res['spread_pct']:.1f}%, threshold {report['thresholds_pct'][stage]:g}%)")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    print(f"{'stage':22s} {'median':>10s} {'baseline':>10s} {'change':>8s}")
+    for stage, cur, ref, change, limit in rows:
+        if ref is None:
+            print(f"{stage:22s} {cur:8.1f}us {'-':>10s} {'new':>8s}")
+        else:
+            flag = '  REGRESSION' if change > limit else ''
+            print(f"{stage:22s} {cur:8.1f}us {ref:8.1f}us {change:+7.1f}%{flag}")
+    if baseline.get('environment') != report['environment']:
+        print("Note: baseline was recorded in a different environment", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed past their threshold", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# online/benchmarks/bench_resize.py
+"""
+Compare the cached bilinear resize operator with scipy.ndimage.zoom.
+
+Run from online/:  python -m benchmarks.bench_resize
+"""
+import argparse
+import timeit
+
+import numpy as np
+from scipy.ndimage import zoom
+
+from src.spectrogram import resize_spec
+
+
+def zoom_stack(spec):
+    resized = zoom(spec, (224 / spec.shape[0], 224 / spec.shape[1]), order=1)
+    return np.stack([resized] * 3, axis=0).astype('float32')
+
+
+def bench(fn, repeat, number):
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--fs', type=int, default=256)
+    p.add_argument('--windows', type=float, nargs='+', default=[1.0, 5.0])
+    p.add_argument('--number', type=int, default=200)
+    p.add_argument('--repeat', type=int, default=5)
+    args = p.parse_args()
+
+    for window in args.windows:
+        # stft(nperseg=fs//2, noverlap=fs//4) shape for this window length
+        n_freqs = args.fs // 4 + 1
+        n_frames = int(window * args.fs) // (args.fs // 4) + 1
+        spec = np.random.rand(n_freqs, n_frames)
+        out = np.empty((3, 224, 224), dtype=np.float32)
+
+        assert np.allclose(resize_spec(spec, out), zoom_stack(spec), atol=1e-6)
+        t_zoom = bench(lambda: zoom_stack(spec), args.repeat, args.number)
+        t_op = bench(lambda: resize_spec(spec, out), args.repeat, args.number)
+        print(f"({n_freqs:3d}, {n_frames:3d}) -> (3, 224, 224): "
+              f"zoom {t_zoom * 1e6:8.1f} us | operator {t_op * 1e6:8.1f} us | "
+              f"speedup x{t_zoom / t_op:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# online/benchmarks/standin_model.py
+"""
+Generate a stand-in for va_regressor.onnx with the same I/O contract.
+
+Inputs `spec` (B, C, H, W) and `de` (B, 26), output `va` (B, 2). The graph
+follows EmotionNet (two 3x3 convs with ReLU/max-pool and global pooling on
+the spectrogram, a 64-unit projection of `de`, a linear head), so its cost
+is close to the real model's. Weights are random; only shapes and timing
+are meaningful.
+
+Run from online/:  python -m benchmarks.standin_model --out /tmp/standin.onnx
+"""
+import argparse
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+
+def make_standin_model(path, batch=None, spec_channels=3, spec_size=(224, 224), seed=0):
+    """
+    Write the stand-in model to `path` and return the path.
+
+    Args:
+        batch: Fixed batch size, or None for a dynamic batch dimension
+        spec_channels, spec_size: Spectrogram input; spec_size=None gives
+            dynamic H/W (a "native" resolution model)
+    """
+    rng = np.random.default_rng(seed)
+
+    def init(name, *shape):
+        w = (rng.standard_normal(shape) / np.sqrt(np.prod(shape[1:]) or 1)).astype(np.float32)
+        return numpy_helper.from_array(w, name)
+
+    b = batch if batch is not None else 'batch'
+    h, w = spec_size if spec_size else ('freq', 'time')
+    inputs = [helper.make_tensor_value_info('spec', TensorProto.FLOAT, [b, spec_channels, h, w]),
+              helper.make_tensor_value_info('de', TensorProto.FLOAT, [b, 26])]
+    outputs = [helper.make_tensor_value_info('va', TensorProto.FLOAT, [b, 2])]
+    inits = [init('c1_w', 16, spec_channels, 3, 3), init('c1_b', 16),
+             init('c2_w', 32, 16, 3, 3), init('c2_b', 32),
+             init('de_w', 26, 64), init('de_b', 64),
+             init('head_w', 96, 2), init('head_b', 2)]
+    nodes = [
+        helper.make_node('Conv', ['spec', 'c1_w', 'c1_b'], ['c1'], pads=[1, 1, 1, 1]),
+        helper.make_node('Relu', ['c1'], ['r1']),
+        helper.make_node('MaxPool', ['r1'], ['p1'], kernel_shape=[2, 2], strides=[2, 2]),
+        helper.make_node('Conv', ['p1', 'c2_w', 'c2_b'], ['c2'], pads=[1, 1, 1, 1]),
+        helper.make_node('Relu', ['c2'], ['r2']),
+        helper.make_node('GlobalAveragePool', ['r2'], ['g']),
+        helper.make_node('Flatten', ['g'], ['spec_feat'], axis=1),
+        helper.make_node('MatMul', ['de', 'de_w'], ['de_mm']),
+        helper.make_node('Add', ['de_mm', 'de_b'], ['de_feat']),
+        helper.make_node('Concat', ['spec_feat', 'de_feat'], ['feat'], axis=1),
+        helper.make_node('MatMul', ['feat', 'head_w'], ['head_mm']),
+        helper.make_node('Add', ['head_mm', 'head_b'], ['va']),
+    ]
+    graph = helper.make_graph(nodes, 'va_regressor_standin', inputs, outputs, inits)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {
+        'spec_channels': str(spec_channels),
+        'spec_size': f'{spec_size[0]}x{spec_size[1]}' if spec_size else 'native',
+    })
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+    return path
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--out', required=True)
+    p.add_argument('--batch', type=int, default=None, help='fixed batch size (default: dynamic)')
+    p.add_argument('--spec-channels', type=int, default=3)
+    p.add_argument('--spec-size', default='224x224', help='HxW or "native"')
+    args = p.parse_args()
+    size = None if args.spec_size == 'native' else tuple(map(int, args.spec_size.split('x')))
+    print(make_standin_model(args.out, args.batch, args.spec_channels, size))
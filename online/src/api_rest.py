@@ -1,8 +1,16 @@
 # online/src/api_rest.py
-from fastapi import FastAPI
+import asyncio
+import math
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
+from . import metrics, wire
+from .history import History
+
 app = FastAPI()
 
 class VAResponse(BaseModel):
@@ -10,19 +18,146 @@ class VAResponse(BaseModel):
     valence: float
     arousal: float
     version: str
+    session_id: str = ""
+    sample_ts: Optional[float] = None   # LSL time of the newest sample used
+    latency: Optional[float] = None     # seconds from that sample to publish
+
+# in-memory last result, overall and per session, as (result counter used
+# as ETag, result) so that a reader never pairs one result with another's ETag
+_last = (0, None)
+_last_by_session = {}
+# Columnar history per session (rows kept; 14400 = 1 h at 4 Hz)
+HISTORY_CAPACITY = 14400
+_history = {}
+# SSE subscribers: (session filter or None, latest-value queue)
+_subscribers = set()
+SSE_KEEPALIVE = 15.0
 
-# in-memory last result
-_last = None
+def _etag(seq):
+    return f'"{seq}"'
 
 @app.get("/v1/va", response_model=VAResponse)
-def get_va():
-    if not _last:
+def get_va(request: Request, response: Response, session_id: Optional[str] = None):
+    if session_id is not None:
+        if session_id not in _last_by_session:
+            raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+        seq, last = _last_by_session[session_id]
+    else:
+        seq, last = _last
+    # Pollers send back the ETag they have; unchanged results cost a bare 304
+    etag = _etag(seq)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    if not last:
         return VAResponse(ts=0, valence=0.0, arousal=0.0, version="")
-    return _last
+    return last
+
+@app.get("/v1/va/stream")
+async def stream_va(session_id: Optional[str] = None):
+    """Server-Sent Events: one `va` event per new result (optionally one session)."""
+    queue = asyncio.Queue(1)
+    sub = (session_id, queue)
+    _subscribers.add(sub)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    return          # server shutting down (close_streams)
+                seq, data = item
+                yield f"id: {seq}\nevent: va\ndata: {data}\n\n"
+        finally:
+            _subscribers.discard(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-def update_last(result: dict):
+@app.get("/v1/va/history")
+async def get_history(session_id: Optional[str] = None, since: Optional[float] = None,
+                until: Optional[float] = None, points: Optional[int] = None):
+    """
+    Results of one session (default: the latest one) with since <= ts <= until,
+    downsampled server-side to at most `points` min/max/mean buckets.
+    Runs on the event loop, like update_last, so no row is appended while
+    the history is queried.
+    """
+    if session_id is None:
+        last = _last[1]
+        session_id = last.session_id if last else ""
+    if session_id not in _history:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    if points is not None and points < 1:
+        raise HTTPException(status_code=422, detail="points must be >= 1")
+    cols = _history[session_id].query(since, until, points)
+    downsampled = cols.pop('downsampled')
+    # JSON has no NaN: unknown latencies are sent as null
+    body = {name: [None if math.isnan(v) else v for v in col.tolist()]
+            for name, col in cols.items()}
+    return {'session_id': session_id, 'downsampled': downsampled, 'points': len(cols['ts']), **body}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of the backend's metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/v1/sessions")
+def get_sessions():
+    return sorted(_last_by_session)
+
+def update_last(result):
+    """Store a result dict or wire.Message and push it to SSE subscribers."""
     global _last
-    _last = VAResponse(**result)
+    message = result if isinstance(result, wire.Message) else wire.Message(result)
+    last = VAResponse(**message.result)
+    seq = _last[0] + 1
+    _last = _last_by_session[last.session_id] = (seq, last)
+    if last.session_id not in _history:
+        _history[last.session_id] = History(HISTORY_CAPACITY)
+    _history[last.session_id].append(last.ts, last.valence, last.arousal,
+                                     message.result.get('latency', math.nan))
+    for session_id, queue in list(_subscribers):
+        if session_id is not None and session_id != last.session_id:
+            continue
+        # Slow readers only get the latest result
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait((seq, message.json))
+
+def close_streams():
+    """End every open SSE response."""
+    for _, queue in list(_subscribers):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+class _Server(uvicorn.Server):
+    async def shutdown(self, sockets=None):
+        # SSE responses never end on their own; uvicorn would wait for them
+        close_streams()
+        await super().shutdown(sockets)
+
+def server(host="0.0.0.0", port=8000, log_level="warning", history_capacity=None,
+           shutdown_timeout=5.0):
+    """
+    A uvicorn server for this app; `await server(...).serve()` runs it in
+    the caller's event loop, next to infer_loop, so it sees update_last().
+    history_capacity sets the rows kept per session for sessions created
+    afterwards. On shutdown SSE streams are ended, and connections still
+    open after shutdown_timeout seconds are closed.
+    """
+    global HISTORY_CAPACITY
+    if history_capacity:
+        HISTORY_CAPACITY = int(history_capacity)
+    config = uvicorn.Config(app, host=host, port=port, log_level=log_level, lifespan="off",
+                            timeout_graceful_shutdown=shutdown_timeout)
+    return _Server(config)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,63 @@
+# online/src/history.py
+import numpy as np
+
+from .utils.ring_buffer import RingBuffer
+
+COLUMNS = ('ts', 'valence', 'arousal', 'latency')
+
+
+class History:
+    """
+    Fixed-capacity columnar history of one session's predictions.
+
+    Rows (ts, valence, arousal, latency) live in a mirrored RingBuffer, so
+    the retained rows are always one contiguous, time-ordered block: range
+    queries are two binary searches on ts and downsampling is a handful of
+    reduceat calls. Timestamps must be appended in non-decreasing order.
+    Queries read the ring's storage in place: run them on the thread that
+    appends (or copy range() first), never next to a concurrent append.
+    """
+    def __init__(self, capacity=14400):
+        self.ring = RingBuffer(capacity, len(COLUMNS), dtype=np.float64)
+
+    def __len__(self):
+        return min(self.ring.seq, self.ring.size)
+
+    def append(self, ts, valence, arousal, latency=np.nan):
+        self.ring.extend(np.array([[ts, valence, arousal, latency]]))
+
+    def range(self, since=None, until=None):
+        """Rows with since <= ts <= until, as a read-only (n, 4) view."""
+        rows = self.ring.get(len(self))
+        ts = rows[:, 0]
+        lo = 0 if since is None else np.searchsorted(ts, since, side='left')
+        hi = len(ts) if until is None else np.searchsorted(ts, until, side='right')
+        return rows[lo:hi]
+
+    def query(self, since=None, until=None, points=None):
+        """
+        Rows in [since, until], reduced to at most `points` time buckets.
+
+        Returns:
+            dict of columns. Downsampled results hold the per-bucket mean of
+            every column plus valence/arousal min and max and the row count.
+        """
+        rows = self.range(since, until)
+        if not points or len(rows) <= points:
+            out = {name: rows[:, i].copy() for i, name in enumerate(COLUMNS)}
+            out['downsampled'] = False
+            return out
+
+        # Equal-width time buckets; empty ones are skipped
+        ts = rows[:, 0]
+        edges = np.linspace(ts[0], ts[-1], points + 1)[:-1]
+        starts = np.unique(np.searchsorted(ts, edges, side='left'))
+        count = np.diff(np.append(starts, len(rows)))
+        mean = np.add.reduceat(rows, starts, axis=0) / count[:, None]
+        out = {name: mean[:, i] for i, name in enumerate(COLUMNS)}
+        for i, name in ((1, 'valence'), (2, 'arousal')):
+            out[name + '_min'] = np.minimum.reduceat(rows[:, i], starts)
+            out[name + '_max'] = np.maximum.reduceat(rows[:, i], starts)
+        out['count'] = count
+        out['downsampled'] = True
+        return out
@@ -1,19 +1,93 @@
 # online/src/lsl_receiver.py
-from pylsl import StreamInlet, resolve_stream
-from .utils.ring_buffer import RingBuffer
-import logging
+from pylsl import (StreamInlet, resolve_byprop, resolve_streams, local_clock,
+                   cf_float32, cf_double64, cf_int8, cf_int16, cf_int32)
+from .sources import Source
 import numpy as np
-class LSLReceiver:
-    def __init__(self, sampling_rate, window_size, n_channels, logger=None):
-        self.logger = logger or logging.getLogger(__name__)
-        self.buf_samples = int(sampling_rate * window_size * 2)
-        self.ring = RingBuffer(self.buf_samples, n_channels)
-        streams = resolve_stream('type', 'EEG')
-        self.inlet = StreamInlet(streams[0])
-        self.logger.info(f"Connected to LSL stream: {streams[0].name()}")
+
+# LSL channel formats that pull_chunk can write straight into a numpy array
+_CHUNK_DTYPES = {
+    cf_float32: np.float32,
+    cf_double64: np.float64,
+    cf_int8: np.int8,
+    cf_int16: np.int16,
+    cf_int32: np.int32,
+}
+
+
+def resolve_eeg_streams(wait_time=1.0):
+    """Return the StreamInfo of every EEG stream seen within `wait_time` seconds."""
+    return [info for info in resolve_streams(wait_time) if info.type() == 'EEG']
+
+
+def stream_id(info):
+    """Stable identifier of an LSL stream, used as its session id."""
+    return info.source_id() or f"{info.name()}@{info.hostname()}"
+
+
+class LSLReceiver(Source):
+    def __init__(self, sampling_rate, window_size, n_channels, logger=None,
+                 chunked=True, max_chunk=16, timeout=0.02, info=None,
+                 time_correction_interval=5.0):
+        """
+        Args:
+            info: StreamInfo to connect to; the first EEG stream found on the
+                network is used when omitted.
+            chunked: Pull blocks with pull_chunk into a preallocated buffer
+                instead of one pull_sample per sample.
+            max_chunk: Maximum samples per pull_chunk call.
+            timeout: Seconds a pull_chunk call may wait for max_chunk samples.
+                Acquisition latency is bounded by min(max_chunk / fs, timeout).
+            time_correction_interval: Seconds between time_correction() calls.
+                Sample timestamps are stored in `times` (parallel to `ring`)
+                converted to this machine's LSL clock (pylsl.local_clock).
+        """
+        if info is None:
+            info = resolve_byprop('type', 'EEG')[0]
+        super().__init__(sampling_rate, window_size, n_channels, stream_id(info), logger)
+        self.time_correction_interval = time_correction_interval
+        self.offset = 0.0
+        self._corrected_at = None
+        self.chunked = chunked
+        self.max_chunk = max_chunk
+        self.timeout = timeout
+        self.inlet = StreamInlet(info)
+        self.logger.info(f"Connected to LSL stream: {info.name()} ({self.id})")
 
     def start(self):
         self.logger.info("Starting LSL receiver loop...")
+        fmt = self.inlet.info().channel_format()
+        if self.chunked and fmt in _CHUNK_DTYPES:
+            self._pull_chunks(_CHUNK_DTYPES[fmt])
+        else:
+            if self.chunked:
+                self.logger.warning("Chunked acquisition needs a numeric stream – pulling single samples")
+            self._pull_samples()
+
+    def _correct_time(self):
+        now = local_clock()
+        if self._corrected_at is None or now - self._corrected_at >= self.time_correction_interval:
+            self._corrected_at = now
+            try:
+                self.offset = self.inlet.time_correction(timeout=1.0)
+            except Exception as e:
+                self.logger.warning(f"LSL time_correction failed, keeping offset {self.offset:.6f}: {e}")
+
+    def _store(self, data, timestamps):
+        self._correct_time()
+        super()._store(data, np.asarray(timestamps, dtype=np.float64) + self.offset)
+
+    def _pull_samples(self):
+        while True:
+            sample, ts = self.inlet.pull_sample()
+            self._store(np.array([sample]), [ts])
+
+    def _pull_chunks(self, dtype):
+        n_channels = self.inlet.channel_count
+        # liblsl writes each chunk directly into this buffer
+        chunk = np.empty((self.max_chunk, n_channels), dtype=dtype)
         while True:
-            sample, _ = self.inlet.pull_sample()
-            self.ring.extend(np.array([sample]))
\ No newline at end of file
+            _, timestamps = self.inlet.pull_chunk(
+                timeout=self.timeout, max_samples=self.max_chunk, dest_obj=chunk)
+            n = len(timestamps)
+            if n:
+                self._store(chunk[:n], timestamps)
@@ -2,8 +2,6 @@
 import asyncio
 import yaml
 import time
-import numpy as np
-import threading
 import logging
 
 #logging.basicConfig(
@@ -13,82 +11,197 @@ import logging
 #logging.getLogger('websockets.protocol').setLevel(logging.DEBUG)
 
 from .utils.log_helper import setup_logger
-from .lsl_receiver import LSLReceiver
-from .preprocess import Preprocessor, extract_feats
+from .metrics import LATENCY_SECONDS, REGISTRY, STAGE_SECONDS, RollingQuantiles
+from pylsl import local_clock
+from .pipeline import Pipeline
+from .sessions import SessionManager
 from .onnx_runner import ONNXRunner
+from . import wire
 from .websocket_server import WebSocketServer
 from .mqtt_publisher import MQTTPublisher
+from . import api_rest
 from .api_rest import update_last
 
 async def infer_loop(cfg, logger):
     """
-    Main inference loop:
-      1. Pull data from LSL
+    Main inference loop, run once per hop of step_size * sampling_rate samples:
+      1. Pull data from LSL (or the synthetic/file source of cfg['source'])
       2. Preprocess (bandpass + standardization)
       3. Extract features
       4. Run ONNX model inference
       5. Broadcast results via WebSocket and MQTT
       6. Update REST API cache
+    Steps 2-4 run as pipeline stages (in worker threads by default) so the
+    event loop is left free for the network I/O of step 5.
+
+    Returns once a finite source (a file replayed without looping) is
+    exhausted and its last hop has been published; live streams run forever.
     """
     # Initialize modules
-    lsl = LSLReceiver(cfg['sampling_rate'], cfg['window_size'], cfg['n_channels'], logger)
-    threading.Thread(target=lsl.start, daemon=True).start()
-
-    pre = Preprocessor(cfg['sampling_rate'], cfg['bandpass']['low'], cfg['bandpass']['high'])
-    runner = ONNXRunner(cfg['model_path'])
-    ws = WebSocketServer(cfg['websocket']['host'], cfg['websocket']['port'], logger)
-    mqtt = MQTTPublisher(cfg['mqtt']['broker'], cfg['mqtt']['port'], cfg['mqtt']['topic'], logger)
+    runner = ONNXRunner(cfg['model_path'], cfg.get('onnx'), logger)
+    ws_cfg = cfg['websocket']
+    ws = WebSocketServer(ws_cfg['host'], ws_cfg['port'], logger,
+                         frontend_uri=ws_cfg.get('frontend_uri', "ws://localhost:5000/ws"),
+                         frontend_queue=ws_cfg.get('frontend_queue', 32),
+                         reconnect_min=ws_cfg.get('reconnect_min', 0.5),
+                         reconnect_max=ws_cfg.get('reconnect_max', 30.0),
+                         client_queue=ws_cfg.get('client_queue', 1),
+                         max_lag=ws_cfg.get('max_lag', 40),
+                         slow_clients=ws_cfg.get('slow_clients', 'evict'))
+    mqtt_cfg = cfg['mqtt']
+    mqtt = MQTTPublisher(mqtt_cfg['broker'], mqtt_cfg['port'], mqtt_cfg['topic'], logger,
+                         binary_topic=mqtt_cfg.get('binary_topic'),
+                         qos=mqtt_cfg.get('qos', 0),
+                         rate=mqtt_cfg.get('rate', 0.0),
+                         outbox=mqtt_cfg.get('outbox', 256),
+                         reconnect_min=mqtt_cfg.get('reconnect_min', 1),
+                         reconnect_max=mqtt_cfg.get('reconnect_max', 30))
 
     # Start WebSocket server
     server = ws.start()
     asyncio.ensure_future(server)
+    ws.start_frontend()
+
+    # REST/SSE API in this event loop, so it serves the results published here
+    rest_cfg = cfg.get('rest', {})
+    if rest_cfg.get('enabled', True):
+        rest = api_rest.server(rest_cfg.get('host', '0.0.0.0'), rest_cfg.get('port', 8000),
+                               history_capacity=rest_cfg.get('history_capacity'),
+                               shutdown_timeout=rest_cfg.get('shutdown_timeout', 5.0))
+        asyncio.ensure_future(rest.serve())
+
+    # Feature extraction and inference stages
+    # Sources replaying as fast as the pipeline goes get backpressure, not drops
+    pipe_cfg = cfg.get('pipeline', {})
+    src_cfg = cfg.get('source', {})
+    queue_size = pipe_cfg.get('queue_size', 2)
+    lossless = src_cfg.get('type', 'lsl') != 'lsl' and not src_cfg.get('speed', 1.0)
+    pipeline = Pipeline(runner, pipe_cfg.get('mode', 'thread'), queue_size, logger, lossless=lossless)
+    pipeline.start()
+
+    # One session (source, ring, preprocessing state, hop scheduler) per EEG
+    # stream; each fires every step_size * sampling_rate samples.
+    # Spectrograms are built in the shape the model declares.
+    sess_cfg = cfg.get('sessions', {})
+    sessions = SessionManager(cfg, logger, n_buffers=queue_size + 2,
+                              spec_channels=runner.spec_channels, spec_size=runner.spec_size)
+    sessions.start()
+
+    register_metrics(sessions, pipeline, ws, mqtt)
 
-    # Compute window length and step size in samples
-    length = int(cfg['sampling_rate'] * cfg['window_size'])
+    # Acquisition -> publish latency over the most recent results
+    lat_cfg = cfg.get('latency', {})
+    latency = RollingQuantiles(lat_cfg.get('window', 1200))
+    REGISTRY.gauge('va_latency_rolling_seconds',
+                   'Acquisition to publish latency quantiles over the recent results',
+                   lambda: {str(q): v for q, v in latency.snapshot().items()}, labels=('quantile',))
+    asyncio.ensure_future(report_latency(latency, logger, lat_cfg.get('report_interval', 60.0),
+                                         lat_cfg.get('budget', 0.5)))
 
+    async def schedule():
+        # Hops of all sessions due in the same tick form one inference batch
+        async for hops in sessions.hops(gather=sess_cfg.get('batch_window', 0.0)):
+            await pipeline.put(hops)
+        await pipeline.finish()
+    asyncio.ensure_future(schedule())
+
+    async for batch in pipeline.results():
+        for session_id, end_seq, out in batch:
+            sample_ts = None
+            session = sessions.sessions.get(session_id)
+            if session is not None:
+                try:
+                    sample_ts = session.sample_time(end_seq)
+                except ValueError:
+                    logger.warning(f"[{session_id}] Hop {end_seq} left the buffer before publishing")
+            await publish(cfg, logger, ws, mqtt, session_id, out, sample_ts, latency)
+    logger.info("All sources exhausted")
+    pipeline.stop()
+
+
+async def report_latency(latency, logger, interval=60.0, budget=0.5):
+    """Log rolling latency percentiles; warn when p99 exceeds the budget (seconds)."""
     while True:
-        # 1) Fetch the latest window of data
-        data = lsl.ring.get(length)  # shape: (n_samples, n_channels)
-        # 2) Preprocess
-        filtered = pre.transform(data)
-        # 3) Extract features consistent with offline pipeline
-        spec3, de_vec = extract_feats(filtered.T, cfg['sampling_rate'])
-        # Reshape for model input
-        spec3 = spec3[np.newaxis, ...]  # shape: (1, 3, 224, 224)
-        de_vec = de_vec[np.newaxis, :]  # shape: (1, 26)
-        # 4) Perform model inference
-        out = runner.predict(spec3, de_vec)[0]
-
-        # Print predictions to console
-        logger.info(f"Predicted VA → valence={out[0]:.3f}, arousal={out[1]:.3f}")
-
-        # 5) Prepare result JSON for internal use
-        result = {
-            'ts': time.time(),
+        await asyncio.sleep(interval)
+        q = latency.snapshot()
+        if not q:
+            continue
+        text = ", ".join(f"p{int(k * 100)}={v * 1e3:.1f} ms" for k, v in q.items())
+        if budget and max(q.values()) > budget:
+            logger.warning(f"Acquisition→publish latency over budget ({budget * 1e3:.0f} ms): {text}")
+        else:
+            logger.info(f"Acquisition→publish latency: {text}")
+
+
+def register_metrics(sessions, pipeline, ws, mqtt):
+    """Expose the counters kept by each component, read at scrape time."""
+    def per_session(attr):
+        return lambda: {sid: getattr(s.scheduler, attr) for sid, s in list(sessions.sessions.items())}
+
+    def skipped():
+        # Late hops the scheduler skipped and hops dropped from full pipeline queues
+        return {sid: s.scheduler.dropped + pipeline.dropped_hops.get(sid, 0)
+                for sid, s in list(sessions.sessions.items())}
+    REGISTRY.counter('va_hops_total', 'Hops fired per session', ('session',), fn=per_session('fired'))
+    REGISTRY.counter('va_hops_skipped_total', 'Hops skipped because processing fell behind',
+                     ('session',), fn=skipped)
+    REGISTRY.gauge('va_sessions', 'Active EEG sessions', lambda: len(sessions.sessions))
+    REGISTRY.gauge('va_ws_clients', 'Connected WebSocket subscribers', lambda: len(ws.clients))
+    REGISTRY.gauge('va_ws_client_lag_max', 'Frames the slowest subscriber is behind',
+                   lambda: max((ws.lag(c) for c in list(ws.clients.values())), default=0))
+    REGISTRY.counter('va_ws_evicted_total', 'Subscribers evicted for lagging', fn=lambda: ws.evicted)
+    REGISTRY.gauge('va_queue_depth', 'Items waiting in each queue', lambda: {
+        **pipeline.queue_depths(), 'frontend': ws.frontend_backlog, 'mqtt_outbox': mqtt.backlog,
+    }, labels=('queue',))
+    REGISTRY.counter('va_mqtt_messages_total', 'MQTT messages by outcome', ('outcome',), fn=lambda: {
+        'sent': mqtt.sent, 'coalesced': mqtt.coalesced, 'dropped': mqtt.dropped})
+
+
+async def publish(cfg, logger, ws, mqtt, session_id, out, sample_ts=None, latency=None):
+    """
+    Tag one prediction with its session id and push it to every transport.
+
+    sample_ts is the LSL timestamp (local clock) of the newest sample of the
+    hop; the result then carries it and its acquisition→publish latency,
+    which is also recorded in `latency` (RollingQuantiles).
+    """
+    # Print predictions to console
+    logger.info(f"[{session_id}] Predicted VA → valence={out[0]:.3f}, arousal={out[1]:.3f}")
+
+    # 5) Prepare result JSON for internal use
+    result = {
+        'ts': time.time(),
+        'valence': float(out[0]),
+        'arousal': float(out[1]),
+        'version': cfg['version'],
+        'session_id': session_id
+    }
+    if sample_ts is not None:
+        result['sample_ts'] = sample_ts
+        result['latency'] = local_clock() - sample_ts
+        LATENCY_SECONDS.observe(result['latency'])
+        if latency is not None:
+            latency.observe(result['latency'])
+
+    # 6) Prepare data for frontend (different format)
+    frontend_data = {
+        'type': 'bci_data',
+        'payload': {
             'valence': float(out[0]),
             'arousal': float(out[1]),
-            'version': cfg['version']
-        }
-
-        # 6) Prepare data for frontend (different format)
-        frontend_data = {
-            'type': 'bci_data',
-            'payload': {
-                'valence': float(out[0]),
-                'arousal': float(out[1]),
-                'sessionId': 'live_session'
-            }
+            'sessionId': session_id
         }
+    }
 
-        # 7) Broadcast and publish
-        update_last(result)
+    # 7) Broadcast and publish; each wire format is encoded once and shared
+    with STAGE_SECONDS.labels('publish').time():
+        message = wire.Message(result)
+        update_last(message)
         # 发送到你自己的WebSocket客户端（如果有）
-        await ws.broadcast(result)
+        await ws.broadcast(message)
         # 发送到前端仪表板
-        await ws.send_to_frontend(result)
-        mqtt.publish(result)
-        # Wait until the next step
-        await asyncio.sleep(cfg['step_size'])
+        ws.send_to_frontend(message)
+        mqtt.publish(message)
 
 if __name__ == '__main__':
     # Set up logging
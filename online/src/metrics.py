@@ -0,0 +1,184 @@
+# online/src/metrics.py
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+
+# Seconds; spans sub-millisecond stages up to a stalled hop
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _Timer:
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def samples(self):
+        with self._lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        cum, out = 0, []
+        for le, c in zip(self.buckets + (float('inf'),), counts):
+            cum += c
+            out.append(('_bucket', {'le': _fmt(le)}, cum))
+        return out + [('_sum', {}, total), ('_count', {}, n)]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def samples(self):
+        return [('', {}, self.value)]
+
+
+class RollingQuantiles:
+    """Quantiles over the most recent `window` observations."""
+    def __init__(self, window=1200, quantiles=(0.5, 0.9, 0.99)):
+        self.values = np.empty(window)
+        self.quantiles = tuple(quantiles)
+        self.n = 0
+
+    def observe(self, value):
+        self.values[self.n % len(self.values)] = value
+        self.n += 1
+
+    def snapshot(self):
+        """{quantile: value} over the window; empty before the first observation."""
+        if not self.n:
+            return {}
+        values = self.values[:min(self.n, len(self.values))]
+        return dict(zip(self.quantiles, np.quantile(values, self.quantiles).tolist()))
+
+
+class _Family:
+    def __init__(self, name, help, kind, labelnames, factory=None, fn=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.fn = fn
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child metric for these label values (created on first use)."""
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, self.factory())
+        return child
+
+    def __getattr__(self, attr):
+        # Unlabelled families forward observe/inc/time to their single child
+        if attr in ('observe', 'inc', 'time') and not self.labelnames:
+            return getattr(self.labels(), attr)
+        raise AttributeError(attr)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.fn is not None:
+            value = self.fn()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            children = [(k if isinstance(k, tuple) else (k,), [('', {}, v)]) for k, v in items]
+        else:
+            children = [(k, c.samples()) for k, c in list(self.children.items())]
+        for values, samples in children:
+            base = dict(zip(self.labelnames, values))
+            for suffix, extra, v in samples:
+                labels = {**base, **extra}
+                label_str = ','.join(f'{k}="{_escape(v_)}"' for k, v_ in labels.items())
+                lines.append(f"{self.name}{suffix}{{{label_str}}} {_fmt(v)}" if label_str
+                             else f"{self.name}{suffix} {_fmt(v)}")
+        return lines
+
+
+def _escape(value):
+    # Label values are quoted; backslash, quote and newline must be escaped
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Registry:
+    """
+    Metric families rendered in the Prometheus text exposition format.
+
+    Histograms and counters are updated where the work happens; gauges (and
+    counters kept elsewhere) are read from a callback at scrape time. A
+    callback may return a number or a {label value(s): number} dict.
+    Registering a name again replaces the earlier family.
+    """
+    def __init__(self):
+        self.families = {}
+
+    def _add(self, family):
+        self.families[family.name] = family
+        return family
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(_Family(name, help, 'histogram', labels, lambda: Histogram(buckets)))
+
+    def counter(self, name, help, labels=(), fn=None):
+        return self._add(_Family(name, help, 'counter', labels, Counter, fn))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self._add(_Family(name, help, 'gauge', labels, fn=fn))
+
+    def render(self):
+        lines = []
+        for family in list(self.families.values()):
+            lines += family.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Time per processing stage of a hop, and from submission to prediction
+STAGE_SECONDS = REGISTRY.histogram(
+    'va_stage_seconds', 'Time spent in each processing stage of a hop', ('stage',))
+PIPELINE_SECONDS = REGISTRY.histogram(
+    'va_pipeline_seconds', 'Time from hop submission to prediction (queueing included)')
+LATENCY_SECONDS = REGISTRY.histogram(
+    'va_latency_seconds', 'Acquisition (LSL sample timestamp) to publish latency',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0, 2.5))
@@ -1,26 +1,165 @@
 # online/src/mqtt_publisher.py
 import paho.mqtt.client as mqtt
-import json
+import collections
 import logging
+import threading
+import time
+
+from . import wire
 
 class MQTTPublisher:
-    def __init__(self, broker, port, topic, logger=None):
+    """
+    Non-blocking MQTT publisher.
+
+    paho's network loop runs in its own thread and connects (and reconnects,
+    with backoff) in the background. publish() only hands the encoded result
+    to a flusher thread and never blocks the event loop:
+
+    - while connected, results are sent at most `rate` times per second per
+      topic (0 = every result); a newer result replaces one still waiting
+      for its slot
+    - while the broker is unreachable, results go to a bounded outbox (oldest
+      dropped) that is flushed in order once the connection is back
+
+    With qos > 0 paho itself keeps a message published while the connection
+    is down and resends it on reconnect; such a message counts as handed
+    over and is not buffered again. paho's queue is capped at `outbox` too.
+    """
+    def __init__(self, broker, port, topic, logger=None, binary_topic=None, qos=0, rate=0.0,
+                 outbox=256, reconnect_min=1, reconnect_max=30, keepalive=60, client=None):
+        """
+        Publishes JSON results to `topic` and, when `binary_topic` is set,
+        the compact binary frame (see wire.py) to `binary_topic`.
+        `client` replaces the paho client (e.g. a fake in tests).
+        """
         self.logger = logger or logging.getLogger(__name__)
+        self.topics = [(t, fmt) for t, fmt in ((topic, wire.JSON), (binary_topic, wire.BINARY)) if t]
+        self.qos = qos
+        self.interval = 1.0 / rate if rate else 0.0
+        self.connected = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
         if not broker:
             self.logger.warning("MQTT broker not configured – skipping MQTT publisher")
             self.client = None
             return
-        import paho.mqtt.client as mqtt
-        self.client = mqtt.Client()
-        try:
-            self.client.connect(broker, port)
-            self.logger.info(f"Connected to MQTT broker {broker}:{port}")
-        except Exception as e:
-            self.logger.error(f"Failed to connect to MQTT broker: {e}")
-            self.client = None
 
-    def publish(self, message: dict):
+        self._outbox = collections.deque(maxlen=outbox)   # (topic, payload) while offline
+        self._pending = {}                                # topic -> latest payload while online
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        if client is None:
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client = client
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.reconnect_delay_set(reconnect_min, reconnect_max)
+        self.client.max_queued_messages_set(outbox)
+        self.broker = f"{broker}:{port}"
+        self.client.connect_async(broker, port, keepalive)
+        self.client.loop_start()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if getattr(reason_code, 'is_failure', reason_code != 0):
+            self.logger.error(f"MQTT broker {self.broker} refused connection: {reason_code}")
+            return
+        self.logger.info(f"Connected to MQTT broker {self.broker}")
+        with self._cond:
+            self.connected = True
+            self._cond.notify()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        with self._cond:
+            if self.connected:
+                self.logger.warning(f"Disconnected from MQTT broker {self.broker} ({reason_code}) – "
+                                    f"buffering up to {self._outbox.maxlen} messages")
+            self.connected = False
+            # Results still waiting for their slot become part of the backlog
+            self._buffer(self._pending.items())
+            self._pending.clear()
+
+    def _buffer(self, items):
+        for item in items:
+            if len(self._outbox) == self._outbox.maxlen:
+                self.dropped += 1
+            self._outbox.append(item)
+
+    @property
+    def backlog(self):
+        """Messages waiting in the offline outbox."""
+        return len(self._outbox) if self.client else 0
+
+    def publish(self, message):
+        """Queue a result dict or wire.Message (its encodings are reused)."""
+        if not self.client:
+            return
+        if not isinstance(message, wire.Message):
+            message = wire.Message(message)
+        with self._cond:
+            for topic, fmt in self.topics:
+                payload = message.encoded(fmt)
+                if not self.connected:
+                    self._buffer([(topic, payload)])
+                    continue
+                if topic in self._pending:
+                    self.coalesced += 1
+                self._pending[topic] = payload
+            self._cond.notify()
+
+    def _flush_loop(self):
+        last = 0.0
+        while True:
+            with self._cond:
+                while not self._stopped and not (self.connected and (self._outbox or self._pending)):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                if self._outbox:
+                    batch = list(self._outbox)
+                    self._outbox.clear()
+                else:
+                    wait = last + self.interval - time.monotonic()
+                    if wait > 0:
+                        # Newer results may still replace the pending ones
+                        self._cond.wait(wait)
+                        continue
+                    batch = list(self._pending.items())
+                    self._pending.clear()
+                    last = time.monotonic()
+            failed = [item for item in batch if not self._send(*item)]
+            if failed:
+                # Not connected after all: keep them and wait for the callbacks
+                with self._cond:
+                    # They are older than anything buffered meanwhile: when
+                    # the outbox is short of room, the oldest of them go
+                    overflow = len(failed) + len(self._outbox) - self._outbox.maxlen
+                    if overflow > 0:
+                        self.dropped += overflow
+                        failed = failed[overflow:]
+                    self._outbox.extendleft(reversed(failed))
+                    self._cond.wait(0.1)
+
+    def _send(self, topic, payload):
+        """False when the message should be buffered and retried."""
+        rc = self.client.publish(topic, payload, qos=self.qos).rc
+        if rc == mqtt.MQTT_ERR_QUEUE_SIZE:
+            # paho's queue is full: retrying would only spin while offline
+            self.dropped += 1
+            return True
+        if rc != mqtt.MQTT_ERR_SUCCESS and not (rc == mqtt.MQTT_ERR_NO_CONN and self.qos > 0):
+            return False
+        self.sent += 1
+        return True
+
+    def stop(self):
         if not self.client:
             return
-        payload = json.dumps(message)
-        self.client.publish(self.topic, payload)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.client.disconnect()
+        self.client.loop_stop()
@@ -1,37 +1,166 @@
 # online/src/onnx_runner.py
+import hashlib
+import json
+import logging
+import os
+
 import onnxruntime as ort
 import numpy as np
 
+_OPT_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXEC_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def session_options(options: dict = None) -> ort.SessionOptions:
+    """
+    Build SessionOptions from the `onnx` section of runtime.yaml.
+
+    Recognized keys: intra_op_threads, inter_op_threads (0 = onnxruntime
+    default), graph_optimization (disable/basic/extended/all) and
+    execution_mode (sequential/parallel).
+    """
+    options = options or {}
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = int(options.get('intra_op_threads', 0))
+    so.inter_op_num_threads = int(options.get('inter_op_threads', 0))
+    so.graph_optimization_level = _OPT_LEVELS[options.get('graph_optimization', 'all')]
+    so.execution_mode = _EXEC_MODES[options.get('execution_mode', 'sequential')]
+    return so
+
+
+def _graph_source(model_path, options):
+    """What an optimized graph was built from: the model's content and the optimization level."""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return {'model_sha256': digest.hexdigest(),
+            'graph_optimization': options.get('graph_optimization', 'all')}
+
+
 class ONNXRunner:
-    def __init__(self, model_path):
+    def __init__(self, model_path, options: dict = None, logger=None):
         """
         Initialize ONNX Runtime session with CPU provider.
         Automatically discover all model inputs
+
+        Args:
+            model_path: Path of the ONNX model
+            options: The `onnx` section of runtime.yaml (see session_options);
+                additionally `optimized_model_path` caches the optimized graph
+                on disk and `io_binding` enables the preallocated IOBinding path
         """
+        options = options or {}
+        self.logger = logger or logging.getLogger(__name__)
+        so = session_options(options)
+
+        # Reuse the graph optimized by an earlier run when its sidecar
+        # (<optimized_model_path>.source.json) names this model's content,
+        # otherwise let onnxruntime write it out while building this session.
+        path = model_path
+        opt_path = options.get('optimized_model_path')
+        source = sidecar = None
+        if opt_path:
+            source = _graph_source(model_path, options)
+            sidecar = opt_path + '.source.json'
+            cached = None
+            if os.path.exists(opt_path) and os.path.exists(sidecar):
+                with open(sidecar) as f:
+                    cached = json.load(f)
+            if cached == source:
+                path = opt_path
+                so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+                self.logger.info(f"Loading optimized ONNX graph from {opt_path}")
+            else:
+                so.optimized_model_filepath = opt_path
+
         # Create inference session using CPU provider
-        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.session = ort.InferenceSession(path, so, providers=["CPUExecutionProvider"])
+        if opt_path and path != opt_path:
+            with open(sidecar, 'w') as f:
+                json.dump(source, f)
         # Collect all input names, preserving the order defined in the ONNX model
         inputs = self.session.get_inputs()
         self.input_names = [inp.name for inp in inputs]
+        # Models exported with a fixed batch dimension run larger batches in slices
+        batch = inputs[0].shape[0]
+        self.max_batch = batch if isinstance(batch, int) else None
 
-        self.output_name = self.session.get_outputs()[0].name
+        # Spectrogram input contract: "spec_channels" / "spec_size" ("native"
+        # or "HxW") in the model metadata, else the static input shape, else
+        # the original (3, 224, 224)
+        meta = self.session.get_modelmeta().custom_metadata_map
+        shape = inputs[0].shape
+        static = all(isinstance(d, int) for d in shape[1:])
+        self.spec_channels = int(meta.get('spec_channels', shape[1] if static else 3))
+        size = meta.get('spec_size')
+        if size == 'native':
+            self.spec_size = None
+        elif size:
+            self.spec_size = tuple(int(d) for d in size.split('x'))
+        else:
+            self.spec_size = tuple(shape[2:]) if static else (224, 224)
+
+        output = self.session.get_outputs()[0]
+        self.output_name = output.name
+        self.n_outputs = output.shape[-1] if isinstance(output.shape[-1], int) else 2
+
+        self.io_binding = bool(options.get('io_binding', False))
+        if self.io_binding:
+            self._binding = self.session.io_binding()
+            self._outputs = {}      # batch size -> (array, OrtValue)
 
     def predict(self, spec: np.ndarray, de: np.ndarray) -> np.ndarray:
         """
         Run inference on the model given spectrogram and differential entropy.
 
         Args:
-            spec: np.ndarray with shape (1, 3, 224, 224)
-            de:   np.ndarray with shape (1, 26)
+            spec: np.ndarray with shape (B, spec_channels, H, W), by default
+                (B, 3, 224, 224)
+            de:   np.ndarray with shape (B, 26)
 
         Returns:
-            np.ndarray with shape (1, 2), representing [valence, arousal].
+            np.ndarray with shape (B, 2), representing [valence, arousal].
+            With io_binding this is a preallocated buffer that the next call
+            overwrites.
         """
+        if self.max_batch is not None and spec.shape[0] > self.max_batch:
+            # copy: with io_binding every slice returns the same output buffer
+            return np.concatenate([
+                self.predict(spec[i:i + self.max_batch], de[i:i + self.max_batch]).copy()
+                for i in range(0, spec.shape[0], self.max_batch)
+            ])
+        # Only copies when the caller's arrays are not already C-contiguous float32
+        spec = np.ascontiguousarray(spec, dtype=np.float32)
+        de = np.ascontiguousarray(de, dtype=np.float32)
+        if self.io_binding:
+            return self._predict_bound(spec, de)
         # Prepare the input feed dictionary for both model inputs
         feed = {
-            self.input_names[0]: spec.astype(np.float32),
-            self.input_names[1]: de.astype(np.float32),
+            self.input_names[0]: spec,
+            self.input_names[1]: de,
         }
         # Execute the model
         outputs = self.session.run([self.output_name], feed)
-        return np.array(outputs[0])  # shape: (1, 2)
\ No newline at end of file
+        return np.array(outputs[0])  # shape: (B, 2)
+
+    def _predict_bound(self, spec, de):
+        n = spec.shape[0]
+        if n not in self._outputs:
+            out = np.empty((n, self.n_outputs), dtype=np.float32)
+            self._outputs[n] = (out, ort.OrtValue.ortvalue_from_numpy(out))
+        out, out_value = self._outputs[n]
+        # Inputs are bound in place (no copy); the output lands in `out`
+        self._binding.bind_cpu_input(self.input_names[0], spec)
+        self._binding.bind_cpu_input(self.input_names[1], de)
+        self._binding.bind_ortvalue_output(self.output_name, out_value)
+        self.session.run_with_iobinding(self._binding)
+        return out
@@ -0,0 +1,238 @@
+# online/src/pipeline.py
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .metrics import PIPELINE_SECONDS, REGISTRY, STAGE_SECONDS
+from .preprocess import Preprocessor, de_features, log_spectrogram
+from .spectrogram import IncrementalSTFT, resize_spec, stft_shape
+
+_RING = STAGE_SECONDS.labels('ring_read')
+_FILTER = STAGE_SECONDS.labels('filter')
+_STFT = STAGE_SECONDS.labels('stft')
+_RESIZE = STAGE_SECONDS.labels('resize')
+_DE = STAGE_SECONDS.labels('de')
+_INFERENCE = STAGE_SECONDS.labels('inference')
+_DROPPED = REGISTRY.counter('va_pipeline_dropped_total',
+                            'Batches dropped because a pipeline queue was full').labels()
+_BATCH = REGISTRY.histogram('va_batch_size', 'Hops per inference batch',
+                            buckets=(1, 2, 4, 8, 16, 32, 64)).labels()
+
+
+class FeatureStage:
+    """
+    Turn the ring window ending at a hop into model inputs.
+
+    Holds the preprocessing state of one stream, so calls must not overlap;
+    the pipeline runs each stage on a single worker. spec_channels and
+    spec_size follow the model's input contract (see ONNXRunner); a
+    spec_size of None keeps the native STFT resolution.
+    """
+    def __init__(self, ring, cfg, logger=None, n_buffers=1, spec_channels=3, spec_size=(224, 224)):
+        self.ring = ring
+        self.fs = cfg['sampling_rate']
+        self.logger = logger or logging.getLogger(__name__)
+        self.length = int(cfg['sampling_rate'] * cfg['window_size'])
+        # "window": zero-phase filter of every window (matches offline features)
+        # "stream": causal filter of new samples only, with cached STFT frames
+        self.stream = cfg.get('preprocess', {}).get('mode', 'window') == 'stream'
+        self.pre = Preprocessor(self.fs, cfg['bandpass']['low'], cfg['bandpass']['high'],
+                                window=self.length)
+        self.stft = IncrementalSTFT(self.fs, self.length) if self.stream else None
+        # Rotating spectrogram buffers: a buffer may still be read by the
+        # inference stage while the next hop is being extracted.
+        size = tuple(spec_size) if spec_size else stft_shape(self.fs, self.length)
+        self._bufs = np.empty((n_buffers, 1, spec_channels) + size, dtype=np.float32)
+        self._next_buf = 0
+        self._seq = None
+        self.read_seq = None    # end_seq of the last window read from the ring
+
+    def __call__(self, end_seq):
+        """
+        Returns:
+            spec3: np.ndarray of shape (1, spec_channels, H, W)
+            de_vec: np.ndarray of shape (1, 26)
+        """
+        out = self._bufs[self._next_buf]
+        self._next_buf = (self._next_buf + 1) % len(self._bufs)
+        if self.stream:
+            # Only the samples that arrived since the last hop are filtered
+            n_new = self.length if self._seq is None else end_seq - self._seq
+            with _RING.time():
+                try:
+                    new = self.ring.get(n_new, end_seq=end_seq)
+                except ValueError:
+                    self.logger.warning("Samples were overwritten before filtering – restarting stream filter")
+                    self.pre.reset()
+                    self.stft.reset()
+                    new = self.ring.get(self.length, end_seq=end_seq)
+            self._seq = self.read_seq = end_seq
+            with _FILTER.time():
+                window = self.pre.update(new).T
+            with _STFT.time():
+                spec = self.stft.compute(window, end_seq, self.pre.mean, self.pre.std)
+        else:
+            with _RING.time():
+                data = self.ring.get(self.length, end_seq=end_seq)  # (n_samples, n_channels)
+            with _FILTER.time():
+                window = self.pre.transform(data).T
+            self.read_seq = end_seq
+            with _STFT.time():
+                spec = log_spectrogram(window, self.fs)
+        # Same features as extract_feats(), one timed stage at a time
+        with _RESIZE.time():
+            resize_spec(spec, out[0])
+        with _DE.time():
+            de_vec = de_features(window, self.fs)
+        return out, de_vec[np.newaxis, :]
+
+
+class Pipeline:
+    """
+    Feature extraction and model inference as two stages linked by bounded
+    queues.
+
+    Work is submitted as a list of (session, end_seq) hops that are due in
+    the same tick; their features are stacked and run through the model as
+    one batch. In "thread" mode each stage runs on its own single-thread
+    executor (the numeric work in scipy/numpy/onnxruntime releases the GIL),
+    so the event loop only moves results and does network I/O. In "inline"
+    mode the stages run directly on the event loop. When a queue is full the
+    oldest entry is dropped, keeping latency bounded if a stage falls behind
+    (its hops are counted per session in `dropped_hops`); in lossless mode
+    producers wait for room instead (backpressure), which suits sources
+    that can go as fast as the pipeline (see sources.py).
+    """
+    def __init__(self, runner, mode='thread', queue_size=2, logger=None, lossless=False):
+        if mode not in ('inline', 'thread'):
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        self.runner = runner
+        self.mode = mode
+        self.lossless = lossless
+        self.logger = logger or logging.getLogger(__name__)
+        self._inputs = asyncio.Queue(queue_size)
+        self._feats = asyncio.Queue(queue_size)
+        self._results = asyncio.Queue(queue_size)
+        self._executors = []
+        self._tasks = []
+        self.dropped = 0            # batches dropped from a full queue
+        self.dropped_hops = {}      # session id -> hops lost with them
+
+    def start(self):
+        self._tasks = [
+            asyncio.ensure_future(self._stage(self._extract, self._inputs, self._feats)),
+            asyncio.ensure_future(self._stage(self._predict, self._feats, self._results)),
+        ]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+
+    def submit(self, hops):
+        """Queue a list of (session, end_seq) hops for processing."""
+        self._put_latest(self._inputs, (hops, time.perf_counter()))
+
+    async def put(self, hops):
+        """submit(), waiting for room in lossless mode."""
+        if self.lossless:
+            await self._inputs.put((hops, time.perf_counter()))
+        else:
+            self.submit(hops)
+
+    async def finish(self):
+        """Mark the end of the input: results() returns once the work before it is done."""
+        if self.lossless:
+            await self._inputs.put(None)
+        else:
+            self._put_latest(self._inputs, None)
+
+    def queue_depths(self):
+        return {'inputs': self._inputs.qsize(), 'features': self._feats.qsize(),
+                'results': self._results.qsize()}
+
+    async def results(self):
+        """Yield, per submitted batch, a list of (session_id, end_seq, prediction)."""
+        while True:
+            batch = await self._results.get()
+            if batch is None:
+                return
+            yield batch
+
+    def _extract(self, hops, submitted):
+        done, specs, des = [], [], []
+        for session, end_seq in hops:
+            try:
+                spec3, de_vec = session.features(end_seq)
+            except Exception:
+                self.logger.error(f"Feature extraction failed for session {session.id}", exc_info=True)
+                continue
+            done.append((session, end_seq))
+            specs.append(spec3)
+            des.append(de_vec)
+        if not done:
+            return None
+        if len(done) == 1:
+            return done, specs[0], des[0], submitted
+        return done, np.concatenate(specs), np.concatenate(des), submitted
+
+    def _predict(self, hops, spec3, de_vec, submitted):
+        with _INFERENCE.time():
+            out = self.runner.predict(spec3, de_vec)
+        _BATCH.observe(len(hops))
+        PIPELINE_SECONDS.observe(time.perf_counter() - submitted)
+        # Copy rows out: the runner may reuse its output buffer on the next call
+        return [(session.id, end_seq, out[i].copy()) for i, (session, end_seq) in enumerate(hops)]
+
+    async def _stage(self, fn, inq, outq):
+        loop = asyncio.get_running_loop()
+        executor = None
+        if self.mode == 'thread':
+            executor = ThreadPoolExecutor(max_workers=1)
+            self._executors.append(executor)
+        while True:
+            args = await inq.get()
+            if args is None:
+                # End of input, passed on after everything queued before it
+                await self._put(outq, None)
+                return
+            try:
+                if executor is None:
+                    res = fn(*args)
+                else:
+                    res = await loop.run_in_executor(executor, fn, *args)
+            except Exception:
+                self.logger.error(f"Pipeline stage {fn.__name__} failed", exc_info=True)
+                continue
+            if res is not None:
+                await self._put(outq, res)
+
+    async def _put(self, queue, item):
+        if self.lossless:
+            await queue.put(item)
+        else:
+            self._put_latest(queue, item)
+
+    def _put_latest(self, queue, item):
+        if queue.full():
+            lost = _session_ids(queue.get_nowait())
+            self.dropped += 1
+            _DROPPED.inc()
+            for session_id in lost:
+                self.dropped_hops[session_id] = self.dropped_hops.get(session_id, 0) + 1
+            self.logger.warning(f"Pipeline fell behind – dropped a batch of {len(lost)} hop(s) "
+                                f"({self.dropped} batches total)")
+        queue.put_nowait(item)
+
+
+def _session_ids(item):
+    """Session ids of the hops in a queued item of any stage."""
+    if item is None:
+        return []
+    if isinstance(item, list):
+        return [session_id for session_id, _, _ in item]     # results
+    return [session.id for session, _ in item[0]]           # inputs and features
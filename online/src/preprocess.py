@@ -1,7 +1,22 @@
 # online/src/preprocess.py
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import butter, sosfiltfilt, stft
-from scipy.ndimage import zoom
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt, stft
+
+from .spectrogram import resize_spec
+
+# Differential entropy bands (delta, theta, alpha, beta, gamma) and the band
+# used for Frontal Alpha Asymmetry.
+DE_BANDS = ((1, 4), (4, 8), (8, 13), (13, 30), (30, 45))
+FAA_BAND = (8, 13)
+
+
+@lru_cache(maxsize=None)
+def design_bandpass(fs: int, low: float, high: float, order: int = 4) -> np.ndarray:
+    """Design (once) the second-order sections of a Butterworth bandpass."""
+    return butter(order, [low, high], btype='bandpass', fs=fs, output='sos')
+
 
 def bandpass(data: np.ndarray, fs: int, low: float = 0.5, high: float = 45, order: int = 4) -> np.ndarray:
     """
@@ -16,16 +31,73 @@ def bandpass(data: np.ndarray, fs: int, low: float = 0.5, high: float = 45, orde
     Returns:
         Filtered data of same shape
     """
-    sos = butter(order, [low, high], btype='bandpass', fs=fs, output='sos')
+    sos = design_bandpass(fs, low, high, order)
     return sosfiltfilt(sos, data, axis=-1)
 
+
+class FilterBank:
+    """
+    A fixed set of bandpass filters designed once and applied together.
+
+    Use get_filter_bank() to share one instance per (fs, bands, order).
+    """
+    def __init__(self, fs: int, bands=DE_BANDS, order: int = 4):
+        self.fs = fs
+        self.bands = tuple(tuple(b) for b in bands)
+        self.order = order
+        self.sos = [design_bandpass(fs, low, high, order) for low, high in self.bands]
+
+    def apply(self, data: np.ndarray) -> np.ndarray:
+        """
+        Zero-phase filter data through every band.
+
+        Args:
+            data: Array of shape (n_channels, n_times)
+        Returns:
+            Array of shape (n_bands, n_channels, n_times)
+        """
+        out = np.empty((len(self.sos),) + data.shape)
+        for i, sos in enumerate(self.sos):
+            out[i] = sosfiltfilt(sos, data, axis=-1)
+        return out
+
+    def index(self, band) -> int:
+        return self.bands.index(tuple(band))
+
+
+@lru_cache(maxsize=None)
+def get_filter_bank(fs: int, bands=DE_BANDS, order: int = 4) -> FilterBank:
+    return FilterBank(fs, bands, order)
+
 class Preprocessor:
     """
     Preprocessor for online data: bandpass filter and z-score normalization.
+
+    Two paths are available:
+      * transform(): zero-phase filtering of a whole window at once (matches
+        the offline pipeline, used for parity checks).
+      * update(): streaming mode. Only the newly arrived samples are filtered
+        with a causal sosfilt whose state (zi) is carried across hops, and the
+        normalization statistics of the last `window` samples are kept as
+        running sums, so each hop costs O(new samples).
     """
-    def __init__(self, fs: int, low: float, high: float):
+    def __init__(self, fs: int, low: float, high: float, window: int = None):
         self.fs = fs
         self.sos = butter(4, [low, high], btype='bandpass', fs=fs, output='sos')
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """Drop all streaming state (filter memory, window and statistics)."""
+        self._zi = None
+        self._buf = None        # mirrored storage: each sample written twice
+        self._pos = 0           # start of the current window inside _buf
+        self._count = 0         # samples currently held (<= window)
+        self._since_sync = 0    # samples written since sums were recomputed
+        self._sum = None
+        self._sumsq = None
+        self.mean = None
+        self.std = None
 
     def transform(self, data: np.ndarray) -> np.ndarray:
         """
@@ -41,43 +113,129 @@ class Preprocessor:
         std = np.std(filtered, axis=0) + 1e-6
         return (filtered - mean) / std
 
+    def update(self, new: np.ndarray) -> np.ndarray:
+        """
+        Streaming filter and normalize.
+
+        Args:
+            new: Newly arrived samples of shape (n_new, n_channels)
+        Returns:
+            Normalized array of shape (min(seen, window), n_channels) holding
+            the most recent filtered samples.
+        """
+        if self.window is None:
+            raise ValueError("Streaming mode requires a window length")
+        n, n_channels = new.shape
+        if self._zi is None:
+            # Start the filter in steady state for the first sample to avoid
+            # a large step transient on the DC offset of the electrodes.
+            self._zi = sosfilt_zi(self.sos)[:, :, np.newaxis] * new[0].astype(np.float64)
+            self._buf = np.zeros((2 * self.window, n_channels), dtype=np.float64)
+            self._sum = np.zeros(n_channels)
+            self._sumsq = np.zeros(n_channels)
+        filtered, self._zi = sosfilt(self.sos, new, axis=0, zi=self._zi)
+
+        w = self.window
+        if n >= w:
+            self._buf[:w] = filtered[-w:]
+            self._buf[w:] = filtered[-w:]
+            self._pos = 0
+            self._count = w
+            self._resync()
+        else:
+            dropped = max(0, self._count + n - w)
+            if dropped:
+                old = self._buf[self._pos:self._pos + dropped]
+                self._sum -= old.sum(axis=0)
+                self._sumsq -= np.einsum('ij,ij->j', old, old)
+            self._write(filtered)
+            self._sum += filtered.sum(axis=0)
+            self._sumsq += np.einsum('ij,ij->j', filtered, filtered)
+            self._since_sync += n
+            if self._since_sync >= w:
+                # Recompute once per window to stop rounding drift of the
+                # running sums; amortized this is O(1) per sample.
+                self._resync()
 
-def extract_feats(window: np.ndarray, fs: int):
+        count = self._count
+        self.mean = self._sum / count
+        var = np.maximum(self._sumsq / count - self.mean ** 2, 0.0)
+        self.std = np.sqrt(var) + 1e-6
+        view = self._buf[self._pos:self._pos + count]
+        return (view - self.mean) / self.std
+
+    def _write(self, filtered):
+        w = self.window
+        n = filtered.shape[0]
+        end = (self._pos + self._count) % w
+        first = min(n, w - end)
+        for base in (0, w):
+            self._buf[base + end:base + end + first] = filtered[:first]
+            self._buf[base:base + n - first] = filtered[first:]
+        total = self._count + n
+        if total > w:
+            self._pos = (self._pos + total - w) % w
+            self._count = w
+        else:
+            self._count = total
+
+    def _resync(self):
+        view = self._buf[self._pos:self._pos + self._count]
+        self._sum = view.sum(axis=0)
+        self._sumsq = np.einsum('ij,ij->j', view, view)
+        self._since_sync = 0
+
+def extract_feats(window: np.ndarray, fs: int, spec: np.ndarray = None, out: np.ndarray = None,
+                  channels: int = 3, size: tuple = (224, 224)):
     """
     Extract spectrogram and differential entropy features from a data window.
 
     Args:
         window: Array of shape (n_channels, n_times)
         fs: Sampling frequency
+        spec: Optional precomputed (F, T) log-magnitude spectrogram of the
+            window, e.g. from IncrementalSTFT; computed here when omitted
+        out: Optional preallocated float32 (channels, H, W) buffer for spec3;
+            it is overwritten and returned, so reuse it only once consumed
+        channels, size: Shape of spec3 when out is omitted; size=None keeps
+            the native (F, T) resolution of the STFT
     Returns:
-        spec3: np.ndarray of shape (3, 224, 224)
+        spec3: np.ndarray of shape (3, 224, 224) by default
         de_vec: np.ndarray of shape (26,)
     """
     # 1) Spectrogram branch
+    if spec is None:
+        spec = log_spectrogram(window, fs)
+    # Resize to 224x224 (same result as zoom(..., order=1)) into every plane
+    if out is None:
+        out = np.empty((channels,) + tuple(size or spec.shape), dtype=np.float32)
+    spec3 = resize_spec(spec, out)      # (channels, H, W) float32
+
+    # 2) Differential Entropy + FAA branch
+    return spec3, de_features(window, fs)
+
+
+def log_spectrogram(window: np.ndarray, fs: int) -> np.ndarray:
+    """Channel-mean log1p(|STFT|) of a (n_channels, n_times) window -> (F, T)."""
     _, _, Z = stft(window, fs, nperseg=fs//2, noverlap=fs//4)
     spec = np.log1p(np.abs(Z))          # (n_channels, F, T)
-    spec = spec.mean(axis=0)            # collapse channels -> (F, T)
-    # Resize to 224x224
-    spec_resized = zoom(spec, (224 / spec.shape[0], 224 / spec.shape[1]), order=1)
-    spec3 = np.stack([spec_resized] * 3, axis=0).astype('float32')  # (3, H, W)
-
-    # 2) Differential Entropy branch
-    bands = [(1,4), (4,8), (8,13), (13,30), (30,45)]
-    de = []
-    for low, high in bands:
-        bp = bandpass(window, fs, low, high)
-        var = np.var(bp, axis=-1) + 1e-6
-        de.append(0.5 * np.log(2 * np.pi * np.e * var))
-    de = np.array(de)                   # (5, n_channels)
+    return spec.mean(axis=0)            # collapse channels -> (F, T)
+
+
+def de_features(window: np.ndarray, fs: int) -> np.ndarray:
+    """Band differential entropy and frontal alpha asymmetry, tiled to (26,)."""
+    # Differential Entropy: all bands in one pass over the channels
+    bank = get_filter_bank(fs)
+    bp = bank.apply(window)                     # (5, n_channels, n_times)
+    var = np.var(bp, axis=-1)                   # (5, n_channels)
+    de = 0.5 * np.log(2 * np.pi * np.e * (var + 1e-6))
     de_vec = de.mean(axis=1)            # (5,)
 
-    # 3) Frontal Alpha Asymmetry (FAA)
+    # Frontal Alpha Asymmetry (FAA), reusing the alpha band output
     idx_af7, idx_af8 = 0, 1             # adjust to your montage
-    left = np.var(bandpass(window[idx_af7], fs, 8, 13))
-    right = np.var(bandpass(window[idx_af8], fs, 8, 13))
+    alpha = var[bank.index(FAA_BAND)]
+    left, right = alpha[idx_af7], alpha[idx_af8]
     faa = np.log(left+1e-6) - np.log(right+1e-6)
     de_vec = np.concatenate([de_vec, [faa]]).astype('float32')  # (6,)
     # Repeat/tile to length 26
-    de_vec = np.tile(de_vec, 5)[:26]
-
-    return spec3, de_vec
+    return np.tile(de_vec, 5)[:26]
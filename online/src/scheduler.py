@@ -0,0 +1,48 @@
+# online/src/scheduler.py
+import logging
+
+
+class HopScheduler:
+    """
+    Schedule inference hops on the data clock of a RingBuffer.
+
+    A hop fires once `hop` new samples have been written since the previous
+    one, so the output cadence follows the sample counter instead of
+    wall-clock sleeps. Nothing fires while the stream is stalled, and the
+    first hop waits until `min_samples` (a full window) are available. When
+    processing falls behind by whole hops, the late ones are skipped and
+    counted in `dropped`, and the newest hop boundary is returned. due() is
+    polled by SessionManager.hops(), which batches the hops of all sessions.
+    """
+    def __init__(self, ring, hop, min_samples, logger=None):
+        self.ring = ring
+        self.hop = hop
+        self.min_samples = min_samples
+        self.logger = logger or logging.getLogger(__name__)
+        self.next_seq = None
+        self.fired = 0
+        self.dropped = 0
+
+    def due(self):
+        """
+        Return the end sequence number of the hop that is due, or None.
+
+        The end sequence number is one past the last sample of the window
+        to process.
+        """
+        seq = self.ring.seq
+        if self.next_seq is None:
+            if seq < self.min_samples:
+                return None
+            self.next_seq = seq
+        if seq < self.next_seq:
+            return None
+        behind = (seq - self.next_seq) // self.hop
+        if behind:
+            self.dropped += behind
+            self.logger.warning(f"Processing fell behind – dropped {behind} hop(s) "
+                                f"({self.dropped} total)")
+        end_seq = self.next_seq + behind * self.hop
+        self.next_seq = end_seq + self.hop
+        self.fired += 1
+        return end_seq
@@ -0,0 +1,233 @@
+# online/src/score.py
+"""
+Re-score recorded sessions offline with the online features and model.
+
+Windows of window_size seconds slide by step_size over each recording and
+end where the online hops would (the first after one full window). Each is
+filtered and normalized as in window mode (Preprocessor.transform), turned
+into model inputs by extract_feats and scored by ONNXRunner in batches.
+Blocks of windows are spread over a process pool with one runner per
+worker; recordings other than .npy are first loaded, resampled and cached
+as .npy so that every worker memory-maps them.
+
+Run from online/:
+
+    python -m src.score ../data/raw/*.set --out scores.npz
+    python -m src.score archive/*.npy --model model/va_regressor_v2.onnx --out v2.parquet
+
+The output holds one row per window, in columns: session (the file name,
+see session_ids), window, end_seq (samples from the start of the
+recording to the end of the window), t
+(end_seq in seconds), valence, arousal. .npz stores one array per column
+(plus the run settings as JSON in `meta`), .parquet needs pyarrow, .csv is
+plain text.
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import yaml
+
+from .onnx_runner import ONNXRunner
+from .preprocess import Preprocessor, extract_feats
+from .sources import load_recording
+from .spectrogram import stft_shape
+
+# Per-process state of the scoring workers, set by _init_worker
+_worker = {}
+
+
+def window_ends(n_times, length, hop):
+    """End sequence numbers of the windows the online scheduler would score."""
+    return np.arange(length, n_times + 1, hop)
+
+
+def session_ids(paths):
+    """
+    One session id per recording: its file name without extension, or where
+    names repeat (a/s1.set, b/s1.set) the path below their common directory.
+    """
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    dup = {s for s in stems if stems.count(s) > 1}
+    if not dup:
+        return stems
+    full = [os.path.abspath(p) for p in paths]
+    root = os.path.commonpath([os.path.dirname(f) for f in full])
+    ids = [os.path.splitext(os.path.relpath(f, root))[0].replace(os.sep, '/') if s in dup else s
+           for s, f in zip(stems, full)]
+    # The same file given twice: number the repeats
+    return [f"{s}#{ids[:i].count(s)}" if ids.count(s) > 1 else s for i, s in enumerate(ids)]
+
+
+def _cache_recording(index, path, cfg, cache_dir):
+    """Return (.npy path, n_times) of a recording, converting it to .npy if needed."""
+    data = load_recording(path, cfg['sampling_rate'], cfg['n_channels'])
+    if not path.endswith('.npy'):
+        # The index keeps recordings with the same file name apart
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = f"{index:04d}-{stem}.{cfg['sampling_rate']}hz.npy"
+        cached = os.path.join(cache_dir, name)
+        np.save(cached, data)
+        path = cached
+    return path, len(data)
+
+
+def _init_worker(cfg, model_path, onnx_options):
+    runner = ONNXRunner(model_path, onnx_options)
+    fs = cfg['sampling_rate']
+    length = int(fs * cfg['window_size'])
+    size = runner.spec_size or stft_shape(fs, length)
+    _worker.update(cfg=cfg, runner=runner, length=length, path=None, data=None,
+                   pre=Preprocessor(fs, cfg['bandpass']['low'], cfg['bandpass']['high']),
+                   spec_shape=(runner.spec_channels,) + tuple(size))
+
+
+def _score_block(path, ends):
+    """Predictions (len(ends), 2) for the windows of `path` ending at `ends`."""
+    w = _worker
+    if w['path'] != path:
+        w['path'], w['data'] = path, load_recording(path, w['cfg']['sampling_rate'],
+                                                    w['cfg']['n_channels'])
+    data, length, fs = w['data'], w['length'], w['cfg']['sampling_rate']
+    spec = np.empty((len(ends),) + w['spec_shape'], dtype=np.float32)
+    de = np.empty((len(ends), 26), dtype=np.float32)
+    for i, end in enumerate(ends):
+        window = w['pre'].transform(data[end - length:end]).T   # (n_channels, n_times)
+        _, de[i] = extract_feats(window, fs, out=spec[i])
+    return w['runner'].predict(spec, de).copy()
+
+
+def score(paths, cfg, model_path, workers=None, block=256, cache_dir=None):
+    """
+    Score every window of the recordings in `paths`.
+
+    Args:
+        cfg: runtime.yaml settings (sampling_rate, window_size, step_size,
+            bandpass, n_channels, onnx)
+        workers: Worker processes (default: one per CPU); 1 scores in this
+            process
+        block: Windows per task, i.e. per batched inference call
+        cache_dir: Where recordings converted to .npy are kept (default: a
+            temporary directory removed afterwards)
+    Returns:
+        {column: np.ndarray}, one row per window
+    """
+    fs = cfg['sampling_rate']
+    length = int(fs * cfg['window_size'])
+    hop = int(fs * cfg['step_size'])
+    # The cached graph of config/runtime.yaml belongs to its model, not this one
+    onnx_options = dict(cfg.get('onnx') or {}, optimized_model_path=None)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and not onnx_options.get('intra_op_threads'):
+        # One runner per process: keep onnxruntime from oversubscribing cores
+        onnx_options['intra_op_threads'] = 1
+
+    tmp = None
+    if cache_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix='va_score_')
+        cache_dir = tmp.name
+    pool = None
+    try:
+        if workers > 1:
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(cfg, model_path, onnx_options))
+            run = pool.map
+        else:
+            _init_worker(cfg, model_path, onnx_options)
+            run = map
+        n = len(paths)
+        cached = list(run(_cache_recording, range(n), paths, [cfg] * n, [cache_dir] * n))
+
+        tasks, sessions = [], []
+        for session, (path, n_times) in zip(session_ids(paths), cached):
+            ends = window_ends(n_times, length, hop)
+            sessions.append((session, ends))
+            for i in range(0, len(ends), block):
+                tasks.append((path, ends[i:i + block]))
+        preds = list(run(_score_block, *zip(*tasks))) if tasks else []
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if tmp is not None:
+            tmp.cleanup()
+
+    ends = np.concatenate([e for _, e in sessions])
+    pred = np.concatenate(preds) if preds else np.empty((0, 2), np.float32)
+    return {
+        'session': np.concatenate([np.full(len(e), s) for s, e in sessions]),
+        'window': np.concatenate([np.arange(len(e)) for _, e in sessions]),
+        'end_seq': ends,
+        't': ends / fs,
+        'valence': pred[:, 0],
+        'arousal': pred[:, 1],
+    }
+
+
+def write_columns(path, columns, meta):
+    """Write {column: array} to .npz, .parquet or .csv, chosen by the extension."""
+    ext = os.path.splitext(path)[1]
+    if ext == '.npz':
+        np.savez(path, **columns, meta=json.dumps(meta))
+    elif ext == '.parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Writing .parquet needs pyarrow (pip install pyarrow); use .npz or .csv")
+        table = pa.table(columns).replace_schema_metadata({'va_score': json.dumps(meta)})
+        pq.write_table(table, path)
+    elif ext == '.csv':
+        with open(path, 'w', newline='') as f:
+            out = csv.writer(f)
+            out.writerow(columns)
+            out.writerows(zip(*(c.tolist() for c in columns.values())))
+    else:
+        raise ValueError(f"Unsupported output format: {path} (use .npz, .parquet or .csv)")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Score recordings with the online features and model")
+    p.add_argument('recordings', nargs='+', help='.npy arrays (n_times, n_channels) or recordings MNE reads')
+    p.add_argument('--out', required=True, help='.npz, .parquet or .csv')
+    p.add_argument('--config', default='config/runtime.yaml')
+    p.add_argument('--model', default=None, help='ONNX model (default: model_path of the config)')
+    p.add_argument('--channels', type=int, default=62)
+    p.add_argument('--workers', type=int, default=None, help='processes (default: one per CPU)')
+    p.add_argument('--block', type=int, default=256, help='windows per batched inference call')
+    p.add_argument('--cache-dir', default=None, help='keep recordings converted to .npy here')
+    args = p.parse_args()
+    ext = os.path.splitext(args.out)[1]
+    if ext not in ('.npz', '.parquet', '.csv'):
+        p.error("--out must end in .npz, .parquet or .csv")
+    if ext == '.parquet' and importlib.util.find_spec('pyarrow') is None:
+        p.error("writing .parquet needs pyarrow (pip install pyarrow); use .npz or .csv")
+
+    with open(args.config) as f:
+        cfg = yaml.safe_load(f)
+    cfg['n_channels'] = args.channels
+    model = args.model or cfg['model_path']
+    if cfg.get('preprocess', {}).get('mode', 'window') != 'window':
+        print("Note: scoring uses window-mode preprocessing (zero-phase filter per window)")
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+
+    t = time.perf_counter()
+    columns = score(args.recordings, cfg, model, args.workers, args.block, args.cache_dir)
+    elapsed = time.perf_counter() - t
+    meta = {'model': os.path.abspath(model), 'recordings': [os.path.abspath(r) for r in args.recordings],
+            'sampling_rate': cfg['sampling_rate'], 'window_size': cfg['window_size'],
+            'step_size': cfg['step_size'], 'bandpass': cfg['bandpass'],
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    write_columns(args.out, columns, meta)
+    print(f"Scored {len(columns['end_seq'])} windows of {len(args.recordings)} recording(s) "
+          f"in {elapsed:.1f} s → {args.out}")
+
+
+if __name__ == '__main__':
+    main()
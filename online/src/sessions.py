@@ -0,0 +1,146 @@
+# online/src/sessions.py
+import asyncio
+import logging
+import threading
+
+from .lsl_receiver import LSLReceiver, resolve_eeg_streams, stream_id
+from .pipeline import FeatureStage
+from .scheduler import HopScheduler
+from .sources import make_sources
+
+
+class Session:
+    """
+    One EEG stream: its source, ring buffer, feature state and hop schedule.
+
+    An unpaced source (speed 0, see sources.py) is throttled to the hop
+    scheduler: it may write up to the next hop boundary, and no further
+    until that hop has been taken, so no hop is ever skipped; nor so far
+    ahead of feature extraction that a queued window is overwritten.
+    """
+    def __init__(self, source, cfg, logger=None, n_buffers=1, spec_channels=3, spec_size=(224, 224)):
+        self.id = source.id
+        self.source = source
+        self.ring = source.ring
+        self.features = FeatureStage(self.ring, cfg, logger, n_buffers=n_buffers,
+                                     spec_channels=spec_channels, spec_size=spec_size)
+        length = int(cfg['sampling_rate'] * cfg['window_size'])
+        hop = int(cfg['sampling_rate'] * cfg['step_size'])
+        self.scheduler = HopScheduler(self.ring, hop, length, logger=logger)
+        if not getattr(source, 'paced', True):
+            source.throttle = self._room
+
+    def sample_time(self, end_seq):
+        """LSL timestamp (local clock) of the newest sample of the hop ending at end_seq."""
+        return self.source.sample_time(end_seq)
+
+    def _room(self):
+        """Samples the source may write before the next hop must be taken."""
+        sched = self.scheduler
+        if sched.next_seq is None:
+            return max(sched.min_samples - self.ring.seq, 0)
+        # The oldest window not yet read ends at least one hop after the last read
+        read = self.features.read_seq
+        oldest = sched.min_samples if read is None else read + sched.hop
+        limit = min(sched.next_seq, oldest + self.ring.size - self.features.length)
+        return max(limit - self.ring.seq, 0)
+
+
+class SessionManager:
+    """
+    Track the EEG streams served by this backend.
+
+    In single mode only the first EEG stream is opened. In multi mode every
+    EEG stream on the network gets its own session, and new streams are
+    picked up by discover(); synthetic and file sources (cfg['source'])
+    are all opened up front. hops() yields, per tick, all hops that are due
+    across sessions so they can be batched into one inference call.
+    spec_channels/spec_size describe the model input (see ONNXRunner).
+    """
+    def __init__(self, cfg, logger=None, n_buffers=1, spec_channels=3, spec_size=(224, 224)):
+        self.cfg = cfg
+        self.logger = logger or logging.getLogger(__name__)
+        self.n_buffers = n_buffers
+        self.spec_channels = spec_channels
+        self.spec_size = spec_size
+        self.sessions = {}
+
+    def start(self):
+        """Open the sessions of the configured source and mode."""
+        multi = self.cfg.get('sessions', {}).get('mode', 'single') == 'multi'
+        if self.cfg.get('source', {}).get('type', 'lsl') != 'lsl':
+            for source in make_sources(self.cfg, self.logger, multi):
+                self.open(source)
+        elif multi:
+            asyncio.ensure_future(self.discover(self.cfg['sessions'].get('discover_interval', 5.0)))
+        else:
+            self.open()
+
+    def open(self, source=None, info=None):
+        """
+        Start receiving from `source`; without one, connect to an LSL stream
+        (the first EEG stream when info is None).
+        """
+        if source is None:
+            lsl_cfg = self.cfg.get('lsl', {})
+            source = LSLReceiver(self.cfg['sampling_rate'], self.cfg['window_size'],
+                                 self.cfg['n_channels'], self.logger,
+                                 chunked=lsl_cfg.get('chunked', True),
+                                 max_chunk=lsl_cfg.get('max_chunk', 16),
+                                 timeout=lsl_cfg.get('timeout', 0.02),
+                                 info=info,
+                                 time_correction_interval=lsl_cfg.get('time_correction_interval', 5.0))
+        # The session (and a throttle) must exist before the first sample
+        session = Session(source, self.cfg, self.logger, self.n_buffers,
+                          self.spec_channels, self.spec_size)
+        threading.Thread(target=source.start, daemon=True).start()
+        self.sessions[session.id] = session
+        self.logger.info(f"Session {session.id} started ({len(self.sessions)} active)")
+        return session
+
+    async def discover(self, interval=5.0, wait_time=1.0):
+        """Periodically resolve EEG streams and open a session for each new one."""
+        loop = asyncio.get_running_loop()
+        while True:
+            infos = await loop.run_in_executor(None, resolve_eeg_streams, wait_time)
+            for info in infos:
+                if stream_id(info) not in self.sessions:
+                    try:
+                        self.open(info=info)
+                    except Exception:
+                        self.logger.error(f"Failed to open stream {info.name()}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def due(self):
+        """Return [(session, end_seq), ...] for every session with a hop due."""
+        hops = []
+        for session in list(self.sessions.values()):
+            end_seq = session.scheduler.due()
+            if end_seq is not None:
+                hops.append((session, end_seq))
+        return hops
+
+    def exhausted(self):
+        """True once every session's source has finished (live streams never do)."""
+        return bool(self.sessions) and all(s.source.finished for s in list(self.sessions.values()))
+
+    async def hops(self, poll=0.005, gather=0.0):
+        """
+        Yield the hops due in each tick, until every source is exhausted.
+
+        Streams are not phase-aligned, so once a hop is due the manager waits
+        `gather` seconds for other sessions' hops to join the same batch.
+        """
+        while True:
+            # Checked before due(): a source may write its last hop in between
+            exhausted = self.exhausted()
+            hops = self.due()
+            if hops:
+                if gather and len(self.sessions) > len(hops):
+                    await asyncio.sleep(gather)
+                    hops += self.due()
+                yield hops
+            elif exhausted:
+                return
+            else:
+                await asyncio.sleep(poll)
@@ -0,0 +1,187 @@
+# online/src/sources.py
+"""
+Acquisition sources: where a session's samples come from.
+
+A source fills `ring` (samples) and `times` (their LSL-clock timestamps)
+from its start() loop, which runs on its own thread, and is identified by
+`id`. Three kinds are available, picked by the `source` config section:
+
+    lsl        LSLReceiver, a live EEG stream (lsl_receiver.py)
+    synthetic  SyntheticSource, Gaussian noise
+    file       FileSource, a .npy array (memory-mapped) or a recording
+               readable by MNE
+
+Synthetic and file sources replay at `speed` x realtime, or with speed 0
+as fast as the pipeline consumes: the session installs a `throttle` that
+lets a source write only up to the next hop boundary, and the pipeline
+applies backpressure instead of dropping work, so every hop of the input
+is scored exactly once.
+"""
+import glob
+import logging
+import os
+import time
+
+import numpy as np
+from pylsl import local_clock
+
+from .utils.ring_buffer import RingBuffer
+
+
+class Source:
+    """Base of acquisition sources: the ring buffers and their timestamps."""
+    def __init__(self, sampling_rate, window_size, n_channels, source_id, logger=None):
+        self.id = source_id
+        self.logger = logger or logging.getLogger(__name__)
+        self.buf_samples = int(sampling_rate * window_size * 2)
+        self.ring = RingBuffer(self.buf_samples, n_channels)
+        self.times = RingBuffer(self.buf_samples, 1, dtype=np.float64)
+        # Set once a finite source has written its last sample
+        self.finished = False
+
+    def start(self):
+        """Acquisition loop; blocks, so run it on a thread."""
+        raise NotImplementedError
+
+    def sample_time(self, end_seq):
+        """Local LSL time of the sample just before sequence number end_seq."""
+        return float(self.times.get(1, end_seq=end_seq)[0, 0])
+
+    def _store(self, data, timestamps):
+        # Timestamps first: once ring.seq covers a sample, its time is there too
+        self.times.extend(np.asarray(timestamps, dtype=np.float64)[:, None])
+        self.ring.extend(data)
+
+
+class ArraySource(Source):
+    """
+    Replay an (n_times, n_channels) array in chunks.
+
+    With speed > 0 chunk i is due at start + (i + 1) * chunk / (fs * speed)
+    and samples are stamped with that accelerated capture time. With speed 0
+    chunks are written as fast as `throttle` allows and stamped when
+    written. `throttle`, when set, returns how many samples may be written
+    now (0 to wait).
+    """
+    def __init__(self, data, sampling_rate, window_size, source_id, logger=None,
+                 chunk=16, speed=1.0, loop=False, poll=0.001):
+        if data.ndim != 2:
+            raise ValueError(f"Source {source_id}: expected (n_times, n_channels), got {data.shape}")
+        super().__init__(sampling_rate, window_size, data.shape[1], source_id, logger)
+        self.data = data
+        self.fs = sampling_rate
+        self.chunk = chunk
+        self.speed = speed
+        self.loop = loop
+        self.poll = poll
+        self.throttle = None
+        # At pipeline speed a hop may be published long after its samples
+        # left the ring; timestamps are cheap, so keep a minute of them
+        self.times = RingBuffer(max(self.buf_samples, int(sampling_rate * 60)), 1, dtype=np.float64)
+
+    @property
+    def paced(self):
+        return bool(self.speed)
+
+    def start(self):
+        n = len(self.data)
+        dt = 1.0 / (self.fs * self.speed) if self.speed else 0.0
+        t0 = local_clock()
+        pos = seq = 0
+        self.logger.info(f"Replaying {self.id}: {n} samples at "
+                         f"{f'{self.speed:g}x realtime' if self.speed else 'pipeline speed'}")
+        while True:
+            if pos >= n:
+                if not self.loop:
+                    break
+                pos = 0
+            size = min(self.chunk, n - pos)
+            if self.throttle is not None:
+                room = self.throttle()
+                while not room:
+                    time.sleep(self.poll)
+                    room = self.throttle()
+                size = min(size, room)
+            # Slicing a memory map reads just this chunk from disk
+            block = np.asarray(self.data[pos:pos + size], dtype=np.float32)
+            if dt:
+                stamps = t0 + (seq + np.arange(1, size + 1)) * dt
+                wait = stamps[-1] - local_clock()
+                if wait > 0:
+                    time.sleep(wait)
+            else:
+                stamps = np.full(size, local_clock())
+            self._store(block, stamps)
+            pos += size
+            seq += size
+        self.finished = True
+        self.logger.info(f"Source {self.id} finished after {seq} samples")
+
+
+class SyntheticSource(ArraySource):
+    """Gaussian noise, `seconds` long and looped."""
+    def __init__(self, sampling_rate, window_size, n_channels, source_id='synthetic', logger=None,
+                 seconds=60.0, seed=0, **kwargs):
+        rng = np.random.default_rng(seed)
+        data = rng.standard_normal((int(sampling_rate * seconds), n_channels)).astype(np.float32)
+        super().__init__(data, sampling_rate, window_size, source_id, logger, loop=True, **kwargs)
+
+
+class FileSource(ArraySource):
+    """
+    A recorded session: a .npy array of shape (n_times, n_channels) (or its
+    transpose) sampled at sampling_rate, memory-mapped, or any recording
+    MNE can read, loaded and resampled to sampling_rate.
+    """
+    def __init__(self, path, sampling_rate, window_size, n_channels, source_id=None, logger=None,
+                 **kwargs):
+        data = load_recording(path, sampling_rate, n_channels)
+        source_id = source_id or f"file:{os.path.splitext(os.path.basename(path))[0]}"
+        super().__init__(data, sampling_rate, window_size, source_id, logger, **kwargs)
+
+
+def load_recording(path, sampling_rate, n_channels):
+    """
+    Load a recording as an (n_times, n_channels) array at sampling_rate.
+
+    .npy files are memory-mapped (and assumed to be sampled at
+    sampling_rate); anything else is read and resampled with MNE.
+    """
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+        if data.ndim == 2 and data.shape[1] != n_channels and data.shape[0] == n_channels:
+            data = data.T
+    else:
+        import mne
+        raw = mne.io.read_raw(path, preload=True, verbose='ERROR')
+        raw.resample(sampling_rate)
+        data = raw.get_data().T.astype(np.float32)
+    if data.ndim != 2 or data.shape[1] != n_channels:
+        raise ValueError(f"{path}: expected {n_channels} channels, got shape {data.shape}")
+    return data
+
+
+def make_sources(cfg, logger=None, multi=False):
+    """
+    Build the synthetic or file sources described by cfg['source'].
+
+    In single mode one source is returned; in multi mode `streams` synthetic
+    sources, or one per file matching `path` (a glob).
+    """
+    src_cfg = cfg.get('source', {})
+    kind = src_cfg.get('type', 'lsl')
+    args = (cfg['sampling_rate'], cfg['window_size'])
+    opts = dict(chunk=src_cfg.get('chunk', 16), speed=src_cfg.get('speed', 1.0))
+    if kind == 'synthetic':
+        n = src_cfg.get('streams', 1) if multi else 1
+        return [SyntheticSource(*args, cfg['n_channels'], f'synthetic-{i}', logger,
+                                seed=src_cfg.get('seed', 0) + i, **opts) for i in range(n)]
+    if kind == 'file':
+        paths = sorted(glob.glob(src_cfg['path']))
+        if not paths:
+            raise FileNotFoundError(f"No recordings match {src_cfg['path']}")
+        if not multi:
+            paths = paths[:1]
+        return [FileSource(path, *args, cfg['n_channels'], logger=logger,
+                           loop=src_cfg.get('loop', False), **opts) for path in paths]
+    raise ValueError(f"Unknown source type: {kind}")
@@ -0,0 +1,182 @@
+# online/src/spectrogram.py
+from functools import lru_cache
+
+import numpy as np
+from scipy.fft import rfft
+from scipy.signal import get_window
+
+
+class IncrementalSTFT:
+    """
+    Log-magnitude spectrogram of overlapping windows with a frame cache.
+
+    Produces the same (F, T) channel-mean of log1p(|Z|) as
+    ``stft(window, fs, nperseg=fs//2, noverlap=fs//4)``, but keeps the STFT
+    frames that lie fully inside the previous windows and only computes the
+    frames touched by new samples (plus the two zero-padded edge frames).
+
+    Frames are cached in the un-normalized signal domain. Because the STFT is
+    linear, a cached frame is mapped to the current window's z-score with
+    (Z - mean * STFT(1)) / std, so the cache stays valid while the per-window
+    normalization changes. This requires the filtered samples themselves to
+    be stable across hops, i.e. the streaming Preprocessor.update() path.
+    """
+    def __init__(self, fs: int, n_times: int, nperseg: int = None, noverlap: int = None):
+        self.fs = fs
+        self.n_times = n_times
+        self.nperseg = nperseg or fs // 2
+        noverlap = fs // 4 if noverlap is None else noverlap
+        self.hop = self.nperseg - noverlap
+
+        self.win = get_window('hann', self.nperseg)
+        self.scale = 1.0 / self.win.sum()
+        # STFT of a constant 1 over an interior frame (used to undo the mean).
+        # For a Hann window only the first two bins are non-zero.
+        self._w1 = rfft(self.win) * self.scale
+        nz = np.flatnonzero(np.abs(self._w1) > 1e-12 * np.abs(self._w1[0]))
+        self._w1_bins = slice(nz[0], nz[-1] + 1)
+
+        # Frame layout identical to scipy's boundary='zeros', padded=True
+        half = self.nperseg // 2
+        ext_len = n_times + 2 * half
+        ext_len += (-(ext_len - self.nperseg) % self.hop) % self.nperseg
+        self._ext = None
+        n_frames = (ext_len - self.nperseg) // self.hop + 1
+        self.starts = np.arange(n_frames) * self.hop - half   # window coordinates
+        self.interior = (self.starts >= 0) & (self.starts + self.nperseg <= n_times)
+
+        self._cache = {}     # absolute frame start -> raw complex frame (C, F)
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self._cache.clear()
+
+    def compute(self, window: np.ndarray, end_seq: int = None,
+                mean: np.ndarray = None, std: np.ndarray = None) -> np.ndarray:
+        """
+        Args:
+            window: Normalized data of shape (n_channels, n_times)
+            end_seq: Absolute sample index one past the last sample of the
+                window. Without it nothing is cached (plain STFT).
+            mean, std: Per-channel statistics used to normalize the window;
+                None means the window was not rescaled.
+        Returns:
+            np.ndarray of shape (F, T)
+        """
+        n_channels, n_times = window.shape
+        if n_times != self.n_times:
+            raise ValueError(f"Expected {self.n_times} samples, got {n_times}")
+        n_freqs = self.nperseg // 2 + 1
+        # Frames are laid out (C, T, F) so each frame is one contiguous block
+        Z = np.empty((n_channels, len(self.starts), n_freqs), dtype=np.complex128)
+
+        keys = None
+        if end_seq is not None:
+            first = end_seq - n_times
+            keys = first + self.starts
+            mean = np.zeros(n_channels) if mean is None else np.asarray(mean, dtype=np.float64)
+            std = np.ones(n_channels) if std is None else np.asarray(std, dtype=np.float64)
+            # Forget frames that start before this window
+            for key in [k for k in self._cache if k < first]:
+                del self._cache[key]
+
+        hit, todo = [], []
+        for j in range(len(self.starts)):
+            if keys is not None and self.interior[j] and keys[j] in self._cache:
+                hit.append(j)
+            else:
+                todo.append(j)
+        self.hits += len(hit)
+        self.misses += len(todo)
+
+        if hit:
+            inv_std = 1.0 / std
+            bins = self._w1_bins
+            offset = (mean * inv_std)[:, np.newaxis] * self._w1[bins]
+            for j in hit:
+                np.multiply(self._cache[keys[j]], inv_std[:, np.newaxis], out=Z[:, j])
+            Z[:, hit, bins] -= offset[:, np.newaxis]
+
+        if todo:
+            half = self.nperseg // 2
+            if self._ext is None or self._ext.shape[0] != n_channels:
+                self._ext = np.zeros((n_channels, n_times + 2 * half + self.nperseg))
+            self._ext[:, half:half + n_times] = window
+            idx = self.starts[todo][:, np.newaxis] + half + np.arange(self.nperseg)
+            segs = self._ext[:, idx]                     # (C, k, nperseg)
+            frames = rfft(segs * self.win, axis=-1) * self.scale
+            Z[:, todo] = frames
+            if keys is not None:
+                for i, j in enumerate(todo):
+                    if self.interior[j]:
+                        self._cache[keys[j]] = (frames[:, i] * std[:, np.newaxis]
+                                                + mean[:, np.newaxis] * self._w1)
+
+        return np.log1p(np.abs(Z)).mean(axis=0).T
+
+
+def stft_shape(fs: int, n_times: int, nperseg: int = None, noverlap: int = None) -> tuple:
+    """(F, T) of ``stft(window, fs, nperseg, noverlap)`` for a window of n_times samples."""
+    nperseg = nperseg or fs // 2
+    noverlap = fs // 4 if noverlap is None else noverlap
+    hop = nperseg - noverlap
+    # boundary='zeros' pads nperseg // 2 per side, padded=True completes the last frame
+    ext_len = n_times + 2 * (nperseg // 2)
+    ext_len += (-(ext_len - nperseg) % hop) % nperseg
+    return nperseg // 2 + 1, (ext_len - nperseg) // hop + 1
+
+
+def _interp_matrix(n_in: int, n_out: int) -> np.ndarray:
+    """(n_out, n_in) linear interpolation weights on zoom()'s sample grid."""
+    R = np.zeros((n_out, n_in))
+    if n_in == 1:
+        R[:, 0] = 1.0
+        return R
+    # zoom(grid_mode=False) maps output i onto input i * (n_in-1) / (n_out-1)
+    x = np.arange(n_out) * (n_in - 1) / (n_out - 1)
+    i0 = np.minimum(np.floor(x).astype(int), n_in - 2)
+    frac = x - i0
+    rows = np.arange(n_out)
+    R[rows, i0] = 1.0 - frac
+    R[rows, i0 + 1] += frac
+    return R
+
+
+@lru_cache(maxsize=None)
+def resize_operator(in_shape: tuple, out_shape: tuple = (224, 224)):
+    """
+    Separable bilinear resize operator, built once per input shape.
+
+    Returns (Rh, RwT) such that Rh @ spec @ RwT equals
+    ``zoom(spec, (H / F, W / T), order=1)``.
+    """
+    Rh = _interp_matrix(in_shape[0], out_shape[0])
+    RwT = np.ascontiguousarray(_interp_matrix(in_shape[1], out_shape[1]).T)
+    return Rh, RwT
+
+
+def resize_spec(spec: np.ndarray, out: np.ndarray = None, size: tuple = (224, 224)) -> np.ndarray:
+    """
+    Bilinear resize of a (F, T) spectrogram into every plane of `out`.
+
+    Args:
+        spec: Array of shape (F, T)
+        out: Optional preallocated float32 array of shape (n, H, W); a new
+            (3, H, W) array is allocated when omitted
+        size: (H, W) used when out is not given; None keeps (F, T)
+    Returns:
+        out, with each of its n planes holding the resized spectrogram
+    """
+    if out is None:
+        out = np.empty((3,) + tuple(size or spec.shape), dtype=np.float32)
+    if out.shape[1:] == spec.shape:
+        # Native resolution: nothing to interpolate
+        np.copyto(out[0], spec, casting='same_kind')
+    else:
+        Rh, RwT = resize_operator(spec.shape, out.shape[1:])
+        # Contract the short time axis first: (H, F) @ (F, T) @ (T, W)
+        np.matmul(Rh @ spec, RwT, out=out[0], casting='same_kind')
+    for plane in out[1:]:
+        np.copyto(plane, out[0])
+    return out
@@ -3,36 +3,85 @@ import threading
 import numpy as np
 
 class RingBuffer:
-    def __init__(self, size, n_channels):
+    """
+    Fixed-size sample buffer with mirrored storage.
+
+    Every sample is written twice, at slot i and i + size, so any run of up
+    to `size` consecutive samples is one contiguous slice of the storage and
+    reads never copy. `seq` counts all samples ever written; the sample with
+    sequence number k lives in slot k % size.
+
+    Reads return read-only views into the storage. A view stays valid until
+    the writer has advanced another (size - length) samples, so consume or
+    copy it within that time.
+    """
+    def __init__(self, size, n_channels, dtype=np.float32):
         self.size = size
         self.n_channels = n_channels
-        self.buffer = np.zeros((size, n_channels), dtype=np.float32)
-        self.index = 0
+        self.buffer = np.zeros((2 * size, n_channels), dtype=dtype)
+        self.index = 0      # next slot to write, in [0, size)
+        self.seq = 0        # total samples written so far
         self.lock = threading.Lock()
 
     def extend(self, data):
         with self.lock:
             n = data.shape[0]
             if n >= self.size:
-                self.buffer = data[-self.size:]
-                self.index = 0
+                # Only the newest `size` samples survive; keep sample k in slot k % size
+                block = data[-self.size:]
+                start = (self.seq + n) % self.size
+                first = self.size - start
+                for base in (0, self.size):
+                    self.buffer[base + start:base + self.size] = block[:first]
+                    self.buffer[base:base + start] = block[first:]
+                self.index = start
             else:
-                end = (self.index + n) % self.size
-                if end > self.index:
-                    self.buffer[self.index:end] = data
-                else:
-                    part1 = self.size - self.index
-                    self.buffer[self.index:] = data[:part1]
-                    self.buffer[:end] = data[part1:]
-                self.index = end
-
-    def get(self, length):
+                start = self.index
+                first = min(n, self.size - start)
+                for base in (0, self.size):
+                    self.buffer[base + start:base + start + first] = data[:first]
+                    self.buffer[base:base + n - first] = data[first:]
+                self.index = (start + n) % self.size
+            self.seq += n
+
+    def get(self, length, end_seq=None):
+        """
+        Return a contiguous read-only view of `length` samples.
+
+        Args:
+            length: Number of samples
+            end_seq: Sequence number one past the last sample wanted;
+                defaults to the newest sample
+        Returns:
+            np.ndarray view of shape (length, n_channels)
+        """
         with self.lock:
-            if length > self.size:
-                raise ValueError("Request length exceeds buffer size")
-            end = self.index
-            start = (end - length) % self.size
-            if start < end:
-                return self.buffer[start:end].copy()
-            else:
-                return np.vstack((self.buffer[start:], self.buffer[:end]))
\ No newline at end of file
+            return self._view(length, self.seq if end_seq is None else end_seq)
+
+    def since(self, seq):
+        """
+        Return everything written after sequence number `seq`.
+
+        Returns:
+            (view, end_seq): the new samples (at most `size` of them) and the
+            sequence number to pass on the next call. If more than `size`
+            samples arrived, end_seq - seq exceeds len(view) by the number of
+            samples that were overwritten before being read.
+        """
+        with self.lock:
+            end_seq = self.seq
+            n = min(max(end_seq - seq, 0), self.size)
+            return self._view(n, end_seq), end_seq
+
+    def _view(self, length, end_seq):
+        if length > self.size:
+            raise ValueError("Request length exceeds buffer size")
+        behind = self.seq - end_seq
+        if behind < 0 or behind + length > self.size:
+            raise ValueError("Requested samples are not in the buffer")
+        end = (self.index - behind) % self.size
+        if end < length:
+            end += self.size
+        view = self.buffer[end - length:end]
+        view.flags.writeable = False
+        return view
@@ -1,17 +1,75 @@
 # online/src/websocket_server.py
 import asyncio
+import time
 import websockets
 import json
 import logging
+from urllib.parse import parse_qs, urlsplit
+
+from . import wire
+
+
+class _Client:
+    """A subscriber with its own latest-value queue and writer task."""
+    def __init__(self, websocket, queue_size, seq=0, fmt=wire.JSON):
+        self.websocket = websocket
+        self.format = fmt
+        self.queue = asyncio.Queue(queue_size)
+        self.task = None
+        self.sent = 0
+        self.dropped = 0
+        self.sent_seq = seq         # broadcast sequence of the last frame sent
+        self.connected_at = time.monotonic()
+
 
 class WebSocketServer:
-    def __init__(self, host, port, logger=None):
+    """
+    Subscriber WebSocket server plus the link to the frontend dashboard.
+
+    broadcast() serializes a result once and hands it to every client's
+    bounded queue without waiting on any send; each client is drained by
+    its own writer task, so a stalled consumer only falls behind itself.
+    When a client's queue is full its oldest frame is dropped (the client
+    sees the latest values at a lower rate). A client more than `max_lag`
+    frames behind is closed when slow_clients is "evict"; with
+    "downsample" it is kept and simply skips frames.
+
+    Clients get JSON text frames unless they negotiate the compact binary
+    frame (see wire.py) with the "va.binary.v1" subprotocol or
+    ``/ws?format=binary``.
+    """
+    def __init__(self, host, port, logger=None, frontend_uri="ws://localhost:5000/ws",
+                 frontend_queue=32, reconnect_min=0.5, reconnect_max=30.0,
+                 client_queue=1, max_lag=40, slow_clients="evict"):
+        if slow_clients not in ("evict", "downsample"):
+            raise ValueError(f"Unknown slow_clients policy: {slow_clients}")
         self.host = host
         self.port = port
         self.logger = logger or logging.getLogger(__name__)
-        self.clients = set()
+        self.clients = {}           # websocket -> _Client
+        self.client_queue = client_queue
+        self.max_lag = max_lag
+        self.slow_clients = slow_clients
+        self.evicted = 0
+        self._seq = 0
+        # Frontend dashboard link: one long-lived connection fed by a bounded
+        # queue (oldest frames dropped), reconnected with exponential backoff
+        self.frontend_uri = frontend_uri
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self._frontend_queue = asyncio.Queue(frontend_queue)
+        self._frontend_task = None
+        self.frontend_connected = False
+        self.frontend_dropped = 0
 
-    async def handler(self, websocket, path):
+    async def handler(self, websocket, path=None):
+        # websockets >= 10.1 no longer passes the path to the handler
+        if path is None:
+            path = websocket.request.path
+        url = urlsplit(path)
+        path = url.path
+        binary = (getattr(websocket, 'subprotocol', None) == wire.SUBPROTOCOL
+                  or parse_qs(url.query).get('format') == [wire.BINARY])
         # 只接受 /ws 这个路径
         if path != "/ws":
             self.logger.warning(f"Rejected connection on path: {path}")
@@ -19,49 +77,141 @@ class WebSocketServer:
             return
 
         # 正式接入
-        self.clients.add(websocket)
-        self.logger.info(f"Client connected: {websocket.remote_address} (path={path})")
+        client = _Client(websocket, self.client_queue, self._seq,
+                         wire.BINARY if binary else wire.JSON)
+        client.task = asyncio.ensure_future(self._writer(client))
+        self.clients[websocket] = client
+        self.logger.info(f"Client connected: {websocket.remote_address} (path={path}, {client.format})")
         try:
             await websocket.wait_closed()
         except Exception:
             self.logger.error("WebSocket handler exception", exc_info=True)
         finally:
-            self.clients.remove(websocket)
+            client.task.cancel()
+            self.clients.pop(websocket, None)
             self.logger.info(f"Client disconnected: {websocket.remote_address}")
 
-    async def broadcast(self, message: dict):
-        data = json.dumps(message)
+    async def _writer(self, client):
+        try:
+            while True:
+                seq, message = await client.queue.get()
+                await client.websocket.send(message.encoded(client.format))
+                client.sent += 1
+                client.sent_seq = seq
+        except websockets.ConnectionClosed:
+            pass
+
+    async def broadcast(self, message):
+        """
+        Queue one result (a dict or wire.Message) for every client; never
+        waits on a send. Each wire format is encoded once for all clients.
+        """
         if not self.clients:
             return
-        tasks = [asyncio.create_task(ws.send(data)) for ws in self.clients]
-        done, pending = await asyncio.wait(
-            tasks, return_when=asyncio.ALL_COMPLETED
-        )
+        if not isinstance(message, wire.Message):
+            message = wire.Message(message)
+        self._seq += 1
+        for client in list(self.clients.values()):
+            queue = client.queue
+            if queue.full():
+                queue.get_nowait()
+                client.dropped += 1
+            queue.put_nowait((self._seq, message))
+            if self.slow_clients == "evict" and self.lag(client) > self.max_lag:
+                self._evict(client)
+
+    def lag(self, client):
+        """Frames broadcast since the last one this client received."""
+        return self._seq - client.sent_seq
+
+    def _evict(self, client):
+        self.clients.pop(client.websocket, None)
+        client.task.cancel()
+        self.evicted += 1
+        self.logger.warning(f"Evicting slow client {client.websocket.remote_address} "
+                            f"({self.lag(client)} frames behind)")
+        asyncio.ensure_future(client.websocket.close(code=1013, reason="Client too slow"))
+
+    def client_stats(self):
+        """Per-client delivery counters and lag in frames."""
+        now = time.monotonic()
+        return [{
+            'remote': str(c.websocket.remote_address),
+            'format': c.format,
+            'sent': c.sent,
+            'dropped': c.dropped,
+            'lag': self.lag(c),
+            'queued': c.queue.qsize(),
+            'connected_s': now - c.connected_at,
+        } for c in self.clients.values()]
 
     # 在 WebSocketServer 类中添加这个方法：
-    async def send_to_frontend(self, data: dict):
-        """发送数据到前端仪表板"""
-        try:
-            frontend_data = {
-                'type': 'bci_data',
-                'payload': {
-                    'valence': data['valence'],
-                    'arousal': data['arousal'],
-                    'sessionId': data.get('version', 'live_session')
-                }
+    def send_to_frontend(self, data):
+        """发送数据到前端仪表板 (non-blocking: queued for the frontend link task)"""
+        if not self.frontend_uri:
+            return
+        if isinstance(data, wire.Message):
+            data = data.result
+        frontend_data = {
+            'type': 'bci_data',
+            'payload': {
+                'valence': data['valence'],
+                'arousal': data['arousal'],
+                'sessionId': data.get('session_id', 'live_session')
             }
+        }
+        if self._frontend_queue.full():
+            self._frontend_queue.get_nowait()
+            self.frontend_dropped += 1
+        self._frontend_queue.put_nowait(json.dumps(frontend_data))
 
-            # 连接到前端WebSocket服务器
-            uri = "ws://localhost:5000/ws"
-            async with websockets.connect(uri) as websocket:
-                await websocket.send(json.dumps(frontend_data))
+    @property
+    def frontend_backlog(self):
+        return self._frontend_queue.qsize()
+
+    def start_frontend(self):
+        """Start the background task that keeps the frontend link open."""
+        if self.frontend_uri and self._frontend_task is None:
+            self._frontend_task = asyncio.ensure_future(self._frontend_loop())
+        return self._frontend_task
+
+    def stop_frontend(self):
+        if self._frontend_task is not None:
+            self._frontend_task.cancel()
+            self._frontend_task = None
+
+    async def _frontend_loop(self):
+        delay = self.reconnect_min
+        while True:
+            try:
+                async with websockets.connect(self.frontend_uri) as websocket:
+                    self.frontend_connected = True
+                    self.logger.info(f"Connected to frontend at {self.frontend_uri}")
+                    delay = self.reconnect_min
+                    while True:
+                        message = await self._frontend_queue.get()
+                        await websocket.send(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Log once per outage, not on every retry
+                if self.frontend_connected or delay == self.reconnect_min:
+                    self.logger.warning(f"Frontend link to {self.frontend_uri} down ({e}); "
+                                        f"retrying with backoff")
+                self.frontend_connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max)
 
-        except Exception as e:
-            self.logger.error(f"Failed to send data to frontend: {e}")
     def start(self):
         # 不要传 path，下面的 handler 会自己过滤
         return websockets.serve(
             self.handler,
             self.host,
-            self.port
+            self.port,
+            select_subprotocol=self._select_subprotocol
         )
+
+    @staticmethod
+    def _select_subprotocol(websocket, subprotocols):
+        # Binary is opt-in: clients that offer no subprotocol keep JSON
+        return wire.SUBPROTOCOL if wire.SUBPROTOCOL in subprotocols else None
@@ -0,0 +1,73 @@
+# online/src/wire.py
+import json
+import struct
+import zlib
+
+# WebSocket subprotocol / query value that selects the binary frame
+SUBPROTOCOL = "va.binary.v1"
+BINARY = "binary"
+JSON = "json"
+
+# Little-endian: magic, format version, flags, ts (s since epoch), valence,
+# arousal, crc32 of the model version string, session id length; followed by
+# the UTF-8 session id (at most 255 bytes, cut at a character boundary).
+# 25 bytes + session id.
+_MAGIC = b"VA"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<2sBBdffIB")
+
+
+def version_id(version: str) -> int:
+    """Stable 32-bit id of a model version string (crc32)."""
+    return zlib.crc32(version.encode("utf-8"))
+
+
+def encode(result: dict) -> bytes:
+    """Pack a VA result dict into the binary frame."""
+    # At most 255 bytes, cut at a code point boundary so it still decodes
+    session = result.get("session_id", "").encode("utf-8")[:255]
+    session = session.decode("utf-8", "ignore").encode("utf-8")
+    return _HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, result["ts"],
+                        result["valence"], result["arousal"],
+                        version_id(result.get("version", "")), len(session)) + session
+
+
+def decode(frame: bytes) -> dict:
+    """
+    Unpack a binary frame. The model version comes back as its id
+    ('version_id'); compare it with version_id(<expected version>).
+    """
+    magic, fmt, _, ts, valence, arousal, vid, n = _HEADER.unpack_from(frame)
+    if magic != _MAGIC or fmt != _FORMAT_VERSION:
+        raise ValueError(f"Not a VA frame (magic={magic!r}, version={fmt})")
+    session = bytes(frame[_HEADER.size:_HEADER.size + n]).decode("utf-8")
+    return {"ts": ts, "valence": valence, "arousal": arousal,
+            "version_id": vid, "session_id": session}
+
+
+class Message:
+    """
+    One result with its wire encodings, each built on first use and then
+    shared by every client and transport that sends it.
+    """
+    __slots__ = ("result", "_json", "_binary")
+
+    def __init__(self, result: dict):
+        self.result = result
+        self._json = None
+        self._binary = None
+
+    @property
+    def json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(self.result)
+        return self._json
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = encode(self.result)
+        return self._binary
+
+    def encoded(self, fmt: str = JSON):
+        return self.binary if fmt == BINARY else self.json
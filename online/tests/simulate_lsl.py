@@ -1,47 +1,199 @@
 #!/usr/bin/env python3
 # online/tests/simulate_lsl.py
+"""
+Replay EEG recordings as LSL streams, for development and load testing.
 
+Every stream pushes chunks stamped with the capture time of their samples,
+on a schedule derived from the sample clock (no per-sample sleep), so it
+keeps up at 256 Hz and well beyond. Streams cycle through the .set files in
+data/raw (or synthetic noise with --synthetic); --speed plays back faster
+than realtime. Jitter, dropouts and bursts can be injected per chunk:
+
+    --jitter MS      chunks are delivered up to MS late (timestamps unchanged)
+    --gap-prob P     with probability P per chunk the device drops out for
+                     --gap-ms; those samples are never sent
+    --burst-prob P   with probability P per chunk the next --burst-chunks
+                     chunks are held back and sent at once
+
+Run from online/:
+
+    python tests/simulate_lsl.py                          # first recording, realtime
+    python tests/simulate_lsl.py --streams 16 --speed 4 --jitter 20 --gap-prob 0.001
+"""
+import argparse
+import glob
 import os
-import sys
+import threading
 import time
 
-import mne
-from pylsl import StreamInfo, StreamOutlet
+import numpy as np
+from pylsl import StreamInfo, StreamOutlet, local_clock
 
 
 BASE_DIR = os.path.abspath(os.path.join(__file__, '..', '..', '..'))
 RAW_DIR  = os.path.join(BASE_DIR, 'data', 'raw')
-if not os.path.isdir(RAW_DIR):
-    raise RuntimeError(f"No such directory: {RAW_DIR}")
 
 
-set_files = [f for f in os.listdir(RAW_DIR) if f.endswith('.set')]
-if not set_files:
-    raise RuntimeError(f"No .set files found in {RAW_DIR}")
-set_path = os.path.join(RAW_DIR, set_files[0])
-print(f"[simulate_lsl] Loading {set_path}")
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    p.add_argument('--raw-dir', default=RAW_DIR)
+    p.add_argument('--pattern', default='*.set', help='recordings to replay (glob in --raw-dir)')
+    p.add_argument('--synthetic', action='store_true', help='Gaussian noise instead of recordings')
+    p.add_argument('--channels', type=int, default=62, help='channels of --synthetic streams')
+    p.add_argument('--streams', type=int, default=1, help='concurrent outlets (recordings are cycled)')
+    p.add_argument('--fs', type=int, default=256,
+                   help='sampling rate')             # 与 online/config/runtime.yaml 中 sampling_rate 保持一致
+    p.add_argument('--speed', type=float, default=1.0, help='playback speed, x realtime')
+    p.add_argument('--chunk', type=int, default=16, help='samples per push')
+    p.add_argument('--duration', type=float, default=None, help='stop after this many seconds')
+    p.add_argument('--loop', action='store_true', help='restart recordings when they end')
+    p.add_argument('--jitter', type=float, default=0.0, help='max extra delivery delay per chunk, ms')
+    p.add_argument('--gap-prob', type=float, default=0.0)
+    p.add_argument('--gap-ms', type=float, default=500.0)
+    p.add_argument('--burst-prob', type=float, default=0.0)
+    p.add_argument('--burst-chunks', type=int, default=8)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--name', default='EEG', help='stream name (sessions are keyed by source_id)')
+    return p.parse_args(argv)
+
+
+def load_recordings(raw_dir, pattern, fs):
+    """Return [(name, (n_times, n_channels) float32 array)] resampled to fs."""
+    import mne
+    paths = sorted(glob.glob(os.path.join(raw_dir, pattern)))
+    if not paths:
+        raise RuntimeError(f"No recordings matching {pattern} in {raw_dir}")
+    recordings = []
+    for path in paths:
+        raw = mne.io.read_raw_eeglab(path, preload=True, verbose='ERROR')
+        raw.resample(fs)
+        data = raw.get_data().T.astype(np.float32)      # 转成 (n_times, n_channels)
+        print(f"[simulate_lsl] Loaded {path}: {data.shape}")
+        recordings.append((os.path.splitext(os.path.basename(path))[0], data))
+    return recordings
+
+
+def synthetic_recording(fs, channels, seconds=60.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return [('synthetic', rng.standard_normal((int(fs * seconds), channels)).astype(np.float32))]
+
+
+class Replayer(threading.Thread):
+    """
+    One outlet replaying `data` in chunks on the sample clock.
+
+    Chunk i is due at start + (i + 1) * chunk / (fs * speed); a late
+    replayer pushes immediately to catch up. Samples are stamped with their
+    (accelerated) capture time, so receivers see the nominal spacing and
+    the delivery delay separately.
+    """
+    def __init__(self, name, source_id, data, fs, speed=1.0, chunk=16, loop=False,
+                 jitter=0.0, gap_prob=0.0, gap_ms=500.0, burst_prob=0.0, burst_chunks=8,
+                 seed=0, stop=None):
+        super().__init__(daemon=True)
+        self.data = data
+        self.fs = fs
+        self.speed = speed
+        self.chunk = chunk
+        self.loop = loop
+        self.jitter = jitter / 1e3
+        self.gap_prob = gap_prob
+        self.gap_samples = int(gap_ms / 1e3 * fs)
+        self.burst_prob = burst_prob
+        self.burst_chunks = burst_chunks
+        self.rng = np.random.default_rng(seed)
+        self.stop = stop or threading.Event()
+        self.info = StreamInfo(name=name, type='EEG', channel_count=data.shape[1],
+                               nominal_srate=fs, channel_format='float32', source_id=source_id)
+        self.outlet = StreamOutlet(self.info)
+        self.pushed = 0         # samples sent
+        self.skipped = 0        # samples dropped by injected gaps
+        self.late = 0           # chunks pushed behind schedule
+
+    def run(self):
+        dt = 1.0 / (self.fs * self.speed)          # wall seconds per sample
+        start = local_clock()
+        seq = 0                                     # samples elapsed on the sample clock
+        held = []                                   # chunks held back by a burst
+        hold = 0
+        n = len(self.data)
+        while not self.stop.is_set():
+            pos = seq % n
+            if seq and pos == 0 and not self.loop:
+                break
+            size = min(self.chunk, n - pos)
+            if self.gap_prob and self.rng.random() < self.gap_prob:
+                # Device dropout: these samples are never captured
+                skip = min(self.gap_samples, n - pos)
+                seq += skip
+                self.skipped += skip
+                continue
+            block = self.data[pos:pos + size]
+            stamps = start + (seq + np.arange(1, size + 1)) * dt
+            seq += size
 
+            due = start + seq * dt
+            if self.jitter:
+                due += self.rng.random() * self.jitter
+            if self.burst_prob and not hold and self.rng.random() < self.burst_prob:
+                hold = self.burst_chunks
+            held.append((block, stamps))
+            if hold:
+                hold -= 1
+                if hold:
+                    continue
+            wait = due - local_clock()
+            if wait > 0:
+                time.sleep(wait)
+            elif wait < -dt * self.chunk:
+                self.late += 1
+            for block, stamps in held:
+                if self.speed == 1.0:
+                    self.outlet.push_chunk(block, float(stamps[-1]))
+                else:
+                    self.outlet.push_chunk(block, stamps.tolist())
+                self.pushed += len(block)
+            held.clear()
 
-raw = mne.io.read_raw_eeglab(set_path, preload=True, verbose='ERROR')
-raw.resample(256)  # 与 online/config/runtime.yaml 中 sampling_rate 保持一致
-data = raw.get_data().T          # 转成 (n_times, n_channels)
-fs   = int(raw.info['sfreq'])
-n_ch = data.shape[1]
-print(f"[simulate_lsl] Data shape: {data.shape}, Sampling rate: {fs} Hz")
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.synthetic:
+        recordings = synthetic_recording(args.fs, args.channels, seed=args.seed)
+    else:
+        recordings = load_recordings(args.raw_dir, args.pattern, args.fs)
 
-info   = StreamInfo(name='EEG', type='EEG',
-                    channel_count=n_ch,
-                    nominal_srate=fs,
-                    channel_format='float32',
-                    source_id='simulate_raw')
-outlet = StreamOutlet(info)
-print(f"[simulate_lsl] Streaming on LSL stream 'EEG' ({n_ch} channels) at {fs} Hz")
+    stop = threading.Event()
+    replayers = []
+    for i in range(args.streams):
+        rec_name, data = recordings[i % len(recordings)]
+        replayers.append(Replayer(
+            args.name, f"simulate_{rec_name}_{i}", data, args.fs, speed=args.speed, chunk=args.chunk,
+            loop=args.loop, jitter=args.jitter, gap_prob=args.gap_prob, gap_ms=args.gap_ms,
+            burst_prob=args.burst_prob, burst_chunks=args.burst_chunks,
+            seed=args.seed + i, stop=stop))
+    print(f"[simulate_lsl] Streaming {len(replayers)} stream(s) at {args.fs} Hz x{args.speed:g}, "
+          f"{args.chunk}-sample chunks")
+    t0 = time.time()
+    for r in replayers:
+        r.start()
 
+    try:
+        while any(r.is_alive() for r in replayers):
+            time.sleep(2.0)
+            elapsed = time.time() - t0
+            pushed = sum(r.pushed for r in replayers)
+            print(f"[simulate_lsl] {elapsed:6.1f}s  {pushed / elapsed:9.0f} samples/s total  "
+                  f"skipped {sum(r.skipped for r in replayers)}  late chunks {sum(r.late for r in replayers)}")
+            if args.duration and elapsed >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for r in replayers:
+        r.join(timeout=1.0)
+    print("[simulate_lsl] Finished streaming.")
 
-interval = 1.0 / fs
-for sample in data:
-    outlet.push_sample(sample.tolist())
-    time.sleep(interval)
 
-print("[simulate_lsl] Finished streaming all samples.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# online/tests/test_api_rest.py
+import asyncio
+import json
+import socket
+import httpx
+from src import api_rest
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _result(i, session_id="s0"):
+    return {'ts': float(i), 'valence': 0.1 * i, 'arousal': 0.0, 'version': 'v', 'session_id': session_id}
+
+
+def test_cohosted_etag_and_sse():
+    port = _free_port()
+
+    async def run():
+        server = api_rest.server("127.0.0.1", port)
+        task = asyncio.ensure_future(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        base = f"http://127.0.0.1:{port}"
+        async with httpx.AsyncClient(base_url=base) as client:
+            api_rest.update_last(_result(1))
+            r = await client.get("/v1/va")
+            etag = r.headers["etag"]
+            assert r.status_code == 200 and r.json()['ts'] == 1.0
+            r = await client.get("/v1/va", headers={"If-None-Match": etag})
+            assert r.status_code == 304 and not r.content
+            api_rest.update_last(_result(2, "s1"))
+            r = await client.get("/v1/va", headers={"If-None-Match": etag})
+            assert r.status_code == 200 and r.json()['ts'] == 2.0
+            # The per-session ETag only changes with that session's results
+            r = await client.get("/v1/va", params={"session_id": "s0"}, headers={"If-None-Match": etag})
+            assert r.status_code == 304
+
+            events = []
+            async with client.stream("GET", "/v1/va/stream", params={"session_id": "s0"}) as r:
+                assert r.headers["content-type"].startswith("text/event-stream")
+                while not api_rest._subscribers:
+                    await asyncio.sleep(0.01)
+                api_rest.update_last(_result(3, "s1"))
+                api_rest.update_last(_result(4, "s0"))
+                async for line in r.aiter_lines():
+                    if line.startswith("data: "):
+                        events.append(json.loads(line[6:]))
+                        break
+        server.should_exit = True
+        await task
+        return events
+
+    events = asyncio.run(run())
+    assert [e['ts'] for e in events] == [4.0]
+    assert not api_rest._subscribers
+
+
+def test_shutdown_ends_open_sse_streams():
+    port = _free_port()
+
+    async def run():
+        server = api_rest.server("127.0.0.1", port)
+        task = asyncio.ensure_future(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            async with client.stream("GET", "/v1/va/stream") as r:
+                while not api_rest._subscribers:
+                    await asyncio.sleep(0.01)
+                server.should_exit = True
+                await asyncio.wait_for(asyncio.shield(task), 3)
+                assert [line async for line in r.aiter_lines()] == []   # stream ended cleanly
+
+    asyncio.run(run())
+    assert not api_rest._subscribers
+
+
+def test_history_endpoint():
+    from fastapi.testclient import TestClient
+    client = TestClient(api_rest.app)
+    for i in range(20):
+        api_rest.update_last(_result(i, "hist"))
+    r = client.get("/v1/va/history", params={"session_id": "hist", "since": 5, "until": 14, "points": 5})
+    body = r.json()
+    assert r.status_code == 200 and body['downsampled'] and body['points'] == 5
+    assert body['count'] == [2] * 5 and body['ts'][0] == 5.5
+    assert body['latency'] == [None] * 5
+    r = client.get("/v1/va/history", params={"session_id": "hist", "since": 18})
+    assert r.json()['ts'] == [18.0, 19.0]
+    r = client.get("/v1/va/history", params={"since": 19})     # the latest session
+    assert r.json()['session_id'] == "hist" and r.json()['ts'] == [19.0]
+    assert client.get("/v1/va/history", params={"session_id": "nope"}).status_code == 404
@@ -0,0 +1,25 @@
+# online/tests/test_history.py
+import numpy as np
+from src.history import History
+
+
+def test_history_range_and_downsampling():
+    h = History(capacity=100)
+    ts = np.arange(150) * 0.25
+    val = np.sin(ts)
+    for t, v in zip(ts, val):
+        h.append(t, v, -v, 0.01)
+    assert len(h) == 100                      # oldest 50 rows dropped
+    rows = h.range(since=20.0, until=30.0)
+    assert rows[0, 0] == 20.0 and rows[-1, 0] == 30.0 and len(rows) == 41
+
+    raw = h.query(since=20.0, until=30.0)
+    assert not raw['downsampled'] and np.array_equal(raw['valence'], np.sin(ts[80:121]))
+
+    ds = h.query(points=10)
+    assert ds['downsampled'] and len(ds['ts']) == 10 and ds['count'].sum() == 100
+    first = val[50:50 + ds['count'][0]]
+    assert np.isclose(ds['valence'][0], first.mean())
+    assert ds['valence_min'][0] == first.min() and ds['valence_max'][0] == first.max()
+    assert np.isclose(ds['arousal_max'][0], -first.min())
+    assert np.allclose(ds['latency'], 0.01)
@@ -0,0 +1,56 @@
+# online/tests/test_lsl_receiver.py
+import threading
+import time
+import numpy as np
+from pylsl import StreamInfo, StreamOutlet, local_clock
+from src.lsl_receiver import LSLReceiver
+
+
+def test_receiver_keeps_sample_timestamps():
+    info = StreamInfo('test_ts', 'EEG', 4, 100, 'float32', 'test_ts_src')
+    outlet = StreamOutlet(info)
+    receiver = LSLReceiver(100, 1.0, 4, info=info, max_chunk=8, timeout=0.01)
+    threading.Thread(target=receiver.start, daemon=True).start()
+    while not outlet.have_consumers():
+        time.sleep(0.01)
+    time.sleep(0.2)
+    t0 = local_clock()
+    data = np.arange(40, dtype=np.float32).reshape(10, 4)
+    outlet.push_chunk(data.tolist(), t0)             # last sample stamped t0
+    deadline = time.time() + 3
+    while receiver.ring.seq < 10 and time.time() < deadline:
+        time.sleep(0.01)
+    assert receiver.ring.seq == 10
+    assert np.array_equal(receiver.ring.get(10), data)
+    # Same host: time_correction() is ~0, so stamps come back as pushed
+    assert abs(receiver.sample_time(10) - t0) < 1e-3
+    assert abs(receiver.sample_time(9) - (t0 - 0.01)) < 1e-3
+
+
+def test_accelerated_replay_keeps_sample_clock():
+    from simulate_lsl import Replayer
+    fs, speed = 100, 8.0
+    data = np.arange(400 * 4, dtype=np.float32).reshape(400, 4)
+    replayer = Replayer('test_replay', 'test_replay_src', data, fs, speed=speed, chunk=10,
+                        gap_prob=0.05, gap_ms=100, seed=3)
+    receiver = LSLReceiver(fs, 5.0, 4, info=replayer.info, max_chunk=10, timeout=0.01)
+    threading.Thread(target=receiver.start, daemon=True).start()
+    while not replayer.outlet.have_consumers():
+        time.sleep(0.01)
+    t = time.time()
+    replayer.start()
+    replayer.join(timeout=5)
+    assert time.time() - t < 400 / fs / speed * 2      # played back faster than realtime
+    deadline = time.time() + 3
+    while receiver.ring.seq < replayer.pushed and time.time() < deadline:
+        time.sleep(0.01)
+    assert replayer.skipped > 0 and replayer.pushed + replayer.skipped == 400
+    n = receiver.ring.seq
+    assert n == replayer.pushed
+    # Received samples are in order, with the gaps missing
+    received = receiver.ring.get(n)[:, 0]
+    assert np.all(np.diff(received) > 0)
+    # Stamps follow the accelerated sample clock, across the gaps too
+    idx = received / 4
+    stamps = np.array([receiver.sample_time(s) for s in range(1, n + 1)])
+    assert np.allclose(np.diff(stamps), np.diff(idx) / (fs * speed), atol=1e-4)
@@ -0,0 +1,43 @@
+# online/tests/test_metrics.py
+from src.metrics import Registry
+
+
+def test_prometheus_rendering():
+    reg = Registry()
+    stage = reg.histogram('t_stage_seconds', 'Stage time', ('stage',), buckets=(0.01, 0.1))
+    for v in (0.005, 0.05, 0.05, 2.0):
+        stage.labels('stft').observe(v)
+    with stage.labels('de').time():
+        pass
+    hops = reg.counter('t_hops_total', 'Hops')
+    hops.inc(3)
+    reg.gauge('t_queue_depth', 'Depth', lambda: {'inputs': 1, 'mqtt': 0}, labels=('queue',))
+    lines = reg.render().splitlines()
+
+    assert '# TYPE t_stage_seconds histogram' in lines
+    assert 't_stage_seconds_bucket{stage="stft",le="0.01"} 1' in lines
+    assert 't_stage_seconds_bucket{stage="stft",le="0.1"} 3' in lines
+    assert 't_stage_seconds_bucket{stage="stft",le="+Inf"} 4' in lines
+    assert 't_stage_seconds_sum{stage="stft"} 2.105' in lines
+    assert 't_stage_seconds_count{stage="de"} 1' in lines
+    assert 't_hops_total 3' in lines
+    assert 't_queue_depth{queue="inputs"} 1' in lines
+
+
+def test_rolling_quantiles_window():
+    import numpy as np
+    from src.metrics import RollingQuantiles
+    q = RollingQuantiles(window=100)
+    assert q.snapshot() == {}
+    for v in range(1000):
+        q.observe(float(v))
+    snap = q.snapshot()
+    assert np.isclose(snap[0.5], np.quantile(np.arange(900, 1000), 0.5))
+    assert 990 < snap[0.99] < 1000
+
+
+def test_label_values_are_escaped():
+    reg = Registry()
+    reg.gauge('t_lag', 'Lag', lambda: {'a"b\\c\nd@host': 1}, labels=('session',))
+    lines = reg.render().splitlines()
+    assert lines[-1] == 't_lag{session="a\\"b\\\\c\\nd@host"} 1'
@@ -0,0 +1,155 @@
+# online/tests/test_mqtt_publisher.py
+import json
+import threading
+import time
+import paho.mqtt.client as mqtt
+from src import wire
+from src.mqtt_publisher import MQTTPublisher
+
+
+class FakeClient:
+    """Stands in for paho: the test decides when the broker is reachable."""
+    def __init__(self):
+        self.online = False
+        self.published = []
+        self.queued = []            # qos > 0 messages paho keeps for the reconnect
+        self.max_queued = 0
+
+    def reconnect_delay_set(self, min_delay, max_delay):
+        pass
+
+    def max_queued_messages_set(self, n):
+        self.max_queued = n
+
+    def connect_async(self, host, port, keepalive):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos=0):
+        if self.online:
+            self.published.append((topic, payload, qos))
+            return mqtt.MQTTMessageInfo(0)
+        if qos > 0:
+            self.queued.append((topic, payload, qos))
+        return _Failed()
+
+    def up(self):
+        self.online = True
+        self.published += self.queued
+        self.queued = []
+        self.on_connect(self, None, None, 0)
+
+    def down(self):
+        self.online = False
+        self.on_disconnect(self, None, None, 7)
+
+
+class _Failed:
+    rc = mqtt.MQTT_ERR_NO_CONN
+
+
+def _result(i):
+    return {'ts': float(i), 'valence': 0.0, 'arousal': 0.0, 'version': 'v', 'session_id': 's'}
+
+
+def _wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.005)
+    assert cond()
+
+
+def test_outbox_buffers_while_offline_and_flushes_in_order():
+    client = FakeClient()
+    pub = MQTTPublisher("broker", 1883, "eeg/va", binary_topic="eeg/va/bin", qos=1,
+                        outbox=4, client=client)
+    start = time.perf_counter()
+    for i in range(3):
+        pub.publish(_result(i))
+    assert time.perf_counter() - start < 0.05 and not client.published
+    assert pub.dropped == 2          # 6 payloads, 4 kept
+    client.up()
+    _wait_for(lambda: len(client.published) == 4)
+    topics = [t for t, _, _ in client.published]
+    assert topics == ["eeg/va", "eeg/va/bin", "eeg/va", "eeg/va/bin"]
+    assert json.loads(client.published[0][1])['ts'] == 1.0
+    assert wire.decode(client.published[-1][1])['ts'] == 2.0
+    assert all(qos == 1 for _, _, qos in client.published)
+    pub.stop()
+
+
+def test_rate_limit_coalesces_to_latest():
+    client = FakeClient()
+    pub = MQTTPublisher("broker", 1883, "eeg/va", rate=5.0, client=client)
+    client.up()
+    pub.publish(_result(0))
+    _wait_for(lambda: len(client.published) == 1)
+    for i in range(1, 6):
+        pub.publish(_result(i))
+    _wait_for(lambda: len(client.published) == 2)
+    time.sleep(0.3)
+    assert [json.loads(p)['ts'] for _, p, _ in client.published] == [0.0, 5.0]
+    assert pub.coalesced == 4
+    client.down()
+    pub.publish(_result(6))
+    client.up()
+    _wait_for(lambda: len(client.published) == 3)
+    pub.stop()
+
+
+def test_qos1_messages_queued_by_paho_are_not_buffered_again():
+    client = FakeClient()
+    pub = MQTTPublisher("broker", 1883, "eeg/va", qos=1, outbox=8, client=client)
+    assert client.max_queued == 8
+    client.up()
+    client.online = False            # connection lost, on_disconnect not called yet
+    for i in range(3):
+        pub.publish(_result(i))
+        _wait_for(lambda: len(client.queued) == i + 1)
+    time.sleep(0.5)                  # flusher retries would add copies here
+    assert len(client.queued) == 3 and pub.backlog == 0
+    client.up()
+    assert [json.loads(p)['ts'] for _, p, _ in client.published] == [0.0, 1.0, 2.0]
+    pub.stop()
+
+
+class StallingClient(FakeClient):
+    """The first publish hangs until `release` is set, then fails."""
+    def __init__(self):
+        super().__init__()
+        self.sending = threading.Event()
+        self.release = threading.Event()
+
+    def publish(self, topic, payload, qos=0):
+        if not self.sending.is_set():
+            self.sending.set()
+            self.release.wait(2.0)
+            return _Failed()
+        return super().publish(topic, payload, qos)
+
+
+def test_failed_batch_overflowing_the_outbox_drops_its_oldest():
+    client = StallingClient()
+    pub = MQTTPublisher("broker", 1883, "eeg/va", outbox=4, client=client)
+    for i in range(2):
+        pub.publish(_result(i))
+    client.online = True
+    client.on_connect(client, None, None, 0)
+    assert client.sending.wait(2.0)          # flusher holds results 0 and 1
+    client.down()
+    for i in range(2, 6):
+        pub.publish(_result(i))              # fills the outbox meanwhile
+    client.release.set()
+    _wait_for(lambda: pub.dropped == 2)
+    client.up()
+    _wait_for(lambda: len(client.published) == 4)
+    assert [json.loads(p)['ts'] for _, p, _ in client.published] == [2.0, 3.0, 4.0, 5.0]
+    pub.stop()
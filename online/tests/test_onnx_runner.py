@@ -1,11 +1,46 @@
 # online/tests/test_onnx_runner.py
+import os
 import numpy as np
+import pytest
+from benchmarks.standin_model import make_standin_model
 from src.onnx_runner import ONNXRunner
 
-def test_onnx_output_shape(tmp_path):
-    # create dummy ONNX or assume real model
-    model_path = 'models/va_regressor.onnx'
-    runner = ONNXRunner(model_path)
-    data = np.random.randn(1, 8, 256).astype(np.float32)
-    out = runner.predict(data)
-    assert out.shape == (1, 2)
\ No newline at end of file
+MODEL = os.path.join(os.path.dirname(__file__), '..', 'model', 'va_regressor.onnx')
+
+
+@pytest.mark.skipif(not os.path.exists(MODEL), reason="model/va_regressor.onnx not available")
+def test_onnx_output_shape():
+    runner = ONNXRunner(MODEL)
+    spec = np.random.randn(1, 3, 224, 224).astype(np.float32)
+    de = np.random.randn(1, 26).astype(np.float32)
+    out = runner.predict(spec, de)
+    assert out.shape == (1, 2)
+
+
+@pytest.mark.parametrize("batch", [None, 1])
+@pytest.mark.parametrize("io_binding", [False, True])
+def test_standin_batches_match_single_rows(tmp_path, batch, io_binding):
+    path = make_standin_model(str(tmp_path / 'standin.onnx'), batch=batch)
+    runner = ONNXRunner(path, {'io_binding': io_binding})
+    assert (runner.spec_channels, runner.spec_size) == (3, (224, 224))
+    spec = np.random.randn(3, 3, 224, 224).astype(np.float32)
+    de = np.random.randn(3, 26).astype(np.float32)
+    rows = [runner.predict(spec[i:i + 1], de[i:i + 1]).copy() for i in range(3)]
+    out = runner.predict(spec, de)
+    assert out.shape == (3, 2)
+    assert np.allclose(out, np.concatenate(rows), atol=1e-5)
+
+
+def test_optimized_graph_cache_follows_the_model(tmp_path):
+    opt = str(tmp_path / 'model.opt.onnx')
+    spec = np.random.randn(1, 3, 224, 224).astype(np.float32)
+    de = np.random.randn(1, 26).astype(np.float32)
+    a = make_standin_model(str(tmp_path / 'a.onnx'), seed=0)
+    b = make_standin_model(str(tmp_path / 'b.onnx'), seed=1)
+    expected = ONNXRunner(b).predict(spec, de).copy()
+    ONNXRunner(a, {'optimized_model_path': opt})
+    assert os.path.exists(opt + '.source.json')
+    # Another model, older than the cached graph, must not load the cached one
+    os.utime(b, (0, 0))
+    out = ONNXRunner(b, {'optimized_model_path': opt}).predict(spec, de)
+    assert np.allclose(out, expected, atol=1e-5)
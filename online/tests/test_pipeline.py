@@ -0,0 +1,57 @@
+# online/tests/test_pipeline.py
+import asyncio
+import threading
+import numpy as np
+from src.pipeline import Pipeline
+
+
+class FakeRunner:
+    def __init__(self):
+        self.threads = set()
+
+    def predict(self, spec, de):
+        self.threads.add(threading.get_ident())
+        return np.concatenate([spec, de], axis=1)
+
+
+class FakeSession:
+    def __init__(self, session_id):
+        self.id = session_id
+
+    def features(self, end_seq):
+        return np.full((1, 1), end_seq), np.ones((1, 1))
+
+
+def test_pipeline_runs_stages_off_loop():
+    runner = FakeRunner()
+    a, b = FakeSession('a'), FakeSession('b')
+
+    async def run():
+        pipe = Pipeline(runner, mode='thread', queue_size=4)
+        pipe.start()
+        pipe.submit([(a, 256)])
+        pipe.submit([(a, 320), (b, 100)])
+        results = pipe.results()
+        out = [await asyncio.wait_for(results.__anext__(), 5) for _ in range(2)]
+        pipe.stop()
+        return out
+
+    first, second = asyncio.run(run())
+    assert [(sid, seq) for sid, seq, _ in first] == [('a', 256)]
+    # hops due in the same tick come back from one batched predict call
+    assert [(sid, seq, out[0]) for sid, seq, out in second] == [('a', 320, 320), ('b', 100, 100)]
+    assert threading.get_ident() not in runner.threads
+
+
+def test_dropped_batches_are_counted_per_session():
+    a, b = FakeSession('a'), FakeSession('b')
+
+    async def run():
+        pipe = Pipeline(FakeRunner(), mode='inline', queue_size=1)   # not started: nothing drains
+        pipe.submit([(a, 1)])
+        pipe.submit([(a, 2), (b, 2)])
+        pipe.submit([(b, 3)])
+        return pipe
+
+    pipe = asyncio.run(run())
+    assert pipe.dropped == 2 and pipe.dropped_hops == {'a': 2, 'b': 1}
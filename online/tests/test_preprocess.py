@@ -1,10 +1,35 @@
 # online/tests/test_preprocess.py
 import numpy as np
-from src.preprocess import Preprocessor
+from src.preprocess import Preprocessor, bandpass, get_filter_bank, DE_BANDS
 
 def test_preprocess_shape():
     data = np.random.randn(256, 8)
     pre = Preprocessor(256, 1, 45)
     out = pre.transform(data)
     assert out.shape == data.shape
-    assert np.allclose(np.mean(out,0), 0, atol=1e-6)
\ No newline at end of file
+    assert np.allclose(np.mean(out,0), 0, atol=1e-6)
+
+def test_preprocess_stream_matches_causal_window():
+    from scipy.signal import sosfilt, sosfilt_zi
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((1024, 8))
+    pre = Preprocessor(256, 1, 45, window=256)
+    for start in range(0, 1024, 64):
+        out = pre.update(data[start:start + 64])
+    # Reference: one causal pass over the whole recording, z-scored per window
+    zi = sosfilt_zi(pre.sos)[:, :, np.newaxis] * data[0]
+    ref, _ = sosfilt(pre.sos, data, axis=0, zi=zi)
+    ref = ref[-256:]
+    ref = (ref - ref.mean(0)) / (ref.std(0) + 1e-6)
+    assert out.shape == (256, 8)
+    assert np.allclose(out, ref, atol=1e-6)
+
+
+def test_filter_bank_matches_bandpass():
+    data = np.random.randn(8, 256)
+    bank = get_filter_bank(256)
+    assert get_filter_bank(256) is bank
+    out = bank.apply(data)
+    assert out.shape == (len(DE_BANDS), 8, 256)
+    for i, (low, high) in enumerate(DE_BANDS):
+        assert np.allclose(out[i], bandpass(data, 256, low, high))
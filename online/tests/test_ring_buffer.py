@@ -0,0 +1,45 @@
+# online/tests/test_ring_buffer.py
+import numpy as np
+import pytest
+from src.utils.ring_buffer import RingBuffer
+
+
+def test_ring_buffer_contiguous_views():
+    ring = RingBuffer(8, 2)
+    data = np.arange(26, dtype=np.float32).reshape(13, 2)
+    for start in range(0, 13, 3):
+        ring.extend(data[start:start + 3])
+    out = ring.get(8)
+    assert out.flags['C_CONTIGUOUS'] and not out.flags.writeable
+    assert np.array_equal(out, data[-8:])
+    assert np.array_equal(ring.get(4, end_seq=11), data[7:11])
+    with pytest.raises(ValueError):
+        ring.get(4, end_seq=6)
+
+
+def test_ring_buffer_since():
+    ring = RingBuffer(8, 2)
+    data = np.random.randn(20, 2).astype(np.float32)
+    ring.extend(data[:5])
+    new, seq = ring.since(0)
+    assert seq == 5 and np.array_equal(new, data[:5])
+    ring.extend(data[5:7])
+    new, seq = ring.since(seq)
+    assert seq == 7 and np.array_equal(new, data[5:7])
+    new, seq = ring.since(seq)
+    assert seq == 7 and new.shape == (0, 2)
+    ring.extend(data[7:20])
+    new, end = ring.since(seq)
+    assert end == 20 and np.array_equal(new, data[12:20])
+
+
+def test_oversized_extend_keeps_slot_of_every_sample():
+    ring = RingBuffer(8, 1)
+    ring.extend(np.arange(3, dtype=np.float32)[:, None])
+    ring.extend(np.arange(3, 23, dtype=np.float32)[:, None])      # more than the buffer holds
+    assert ring.seq == 23 and ring.index == 23 % 8
+    for k in range(15, 23):
+        assert ring.buffer[k % 8, 0] == k and ring.buffer[8 + k % 8, 0] == k
+    assert np.array_equal(ring.get(8)[:, 0], np.arange(15, 23))
+    ring.extend(np.array([[23.0], [24.0]], dtype=np.float32))
+    assert np.array_equal(ring.get(8)[:, 0], np.arange(17, 25))
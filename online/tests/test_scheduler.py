@@ -0,0 +1,20 @@
+# online/tests/test_scheduler.py
+import numpy as np
+from src.scheduler import HopScheduler
+from src.utils.ring_buffer import RingBuffer
+
+
+def test_scheduler_follows_sample_count():
+    ring = RingBuffer(512, 2)
+    sched = HopScheduler(ring, hop=64, min_samples=256)
+    assert sched.due() is None                # window not full yet
+    ring.extend(np.zeros((256, 2)))
+    assert sched.due() == 256
+    ring.extend(np.zeros((63, 2)))
+    assert sched.due() is None                # one sample short of a hop
+    ring.extend(np.zeros((1, 2)))
+    assert sched.due() == 320
+    assert sched.due() is None                # stalled stream: no refire
+    ring.extend(np.zeros((64 * 3 + 10, 2)))   # processing fell behind
+    assert sched.due() == 512
+    assert sched.dropped == 2
@@ -0,0 +1,60 @@
+# online/tests/test_score.py
+import numpy as np
+import pytest
+from benchmarks.standin_model import make_standin_model
+from src.onnx_runner import ONNXRunner
+from src.pipeline import FeatureStage
+from src.score import score, session_ids, write_columns
+from src.utils.ring_buffer import RingBuffer
+
+CFG = {'sampling_rate': 128, 'window_size': 1.0, 'step_size': 0.25, 'n_channels': 4,
+       'bandpass': {'low': 1, 'high': 45}}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_scores_match_online_window_mode(tmp_path, workers):
+    model = make_standin_model(str(tmp_path / 'standin.onnx'))
+    rng = np.random.default_rng(0)
+    for name, n in (('a', 1000), ('b', 600)):
+        np.save(tmp_path / f'{name}.npy', rng.standard_normal((n, 4)).astype(np.float32))
+    paths = [str(tmp_path / 'a.npy'), str(tmp_path / 'b.npy')]
+    cols = score(paths, CFG, model, workers=workers, block=7)
+
+    assert list(cols['session']) == ['a'] * 28 + ['b'] * 15
+    assert list(cols['end_seq'][:3]) == [128, 160, 192] and cols['t'][-1] == 576 / 128
+    assert np.array_equal(cols['window'][28:], np.arange(15))
+
+    # The same windows through the online feature stage and runner
+    data = np.load(paths[1])
+    ring = RingBuffer(len(data), 4)
+    ring.extend(data)
+    runner = ONNXRunner(model)
+    stage = FeatureStage(ring, CFG)
+    for i in (0, 9, 14):
+        spec, de = stage(int(cols['end_seq'][28 + i]))
+        expected = runner.predict(spec, de)[0]
+        assert np.allclose([cols['valence'][28 + i], cols['arousal'][28 + i]], expected, atol=1e-5)
+
+    write_columns(str(tmp_path / 'out.npz'), cols, {'model': model})
+    out = np.load(tmp_path / 'out.npz')
+    assert np.array_equal(out['valence'], cols['valence']) and out['session'][0] == 'a'
+
+
+def test_recordings_with_the_same_name_stay_apart(tmp_path):
+    mne = pytest.importorskip('mne')
+    model = make_standin_model(str(tmp_path / 'standin.onnx'))
+    rng = np.random.default_rng(1)
+    info = mne.create_info(4, CFG['sampling_rate'], 'eeg')
+    paths = []
+    for d in ('a', 'b'):
+        (tmp_path / d).mkdir()
+        raw = mne.io.RawArray(rng.standard_normal((4, 400)), info, verbose='ERROR')
+        paths.append(str(tmp_path / d / 's1_raw.fif'))
+        raw.save(paths[-1], verbose='ERROR')
+    cols = score(paths, CFG, model, workers=2)
+    assert list(np.unique(cols['session'])) == ['a/s1_raw', 'b/s1_raw']
+    for path in paths:
+        alone = score([path], CFG, model, workers=1)
+        rows = cols['session'] == path.split('/')[-2] + '/s1_raw'
+        assert np.allclose(cols['valence'][rows], alone['valence'], atol=1e-5)
+    assert session_ids(['x/s1.set', 'x/s1.set', 'y/s2.set']) == ['x/s1#0', 'x/s1#1', 's2']
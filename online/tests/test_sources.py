@@ -0,0 +1,63 @@
+# online/tests/test_sources.py
+import asyncio
+import time
+import numpy as np
+from src.pipeline import Pipeline
+from src.sessions import SessionManager
+from src.sources import ArraySource, FileSource
+
+CFG = {'sampling_rate': 128, 'window_size': 1.0, 'step_size': 0.25, 'n_channels': 4,
+       'bandpass': {'low': 1, 'high': 45}}
+
+
+class FakeRunner:
+    def predict(self, spec, de):
+        return np.zeros((len(spec), 2), dtype=np.float32)
+
+
+def test_file_source_is_memory_mapped_and_transposed(tmp_path):
+    data = np.random.randn(4, 300).astype(np.float32)          # (n_channels, n_times)
+    np.save(tmp_path / 'rec.npy', data)
+    source = FileSource(str(tmp_path / 'rec.npy'), 128, 1.0, 4, speed=0)
+    assert isinstance(source.data.base, np.memmap) or isinstance(source.data, np.memmap)
+    assert source.data.shape == (300, 4) and source.id == 'file:rec'
+    source.start()
+    assert source.finished and source.ring.seq == 300
+    assert np.array_equal(source.ring.get(200), data.T[100:])
+
+
+def test_paced_source_stamps_accelerated_sample_clock():
+    source = ArraySource(np.zeros((64, 2), np.float32), 128, 1.0, 'paced', chunk=16, speed=8)
+    t = time.perf_counter()
+    source.start()
+    assert 64 / 128 / 8 * 0.9 < time.perf_counter() - t < 64 / 128 / 8 * 3
+    stamps = np.array([source.sample_time(s) for s in range(1, 65)])
+    assert np.allclose(np.diff(stamps), 1 / (128 * 8))
+
+
+def test_unpaced_files_score_every_hop_once(tmp_path):
+    for name, n in (('a', 1280), ('b', 900)):
+        np.save(tmp_path / f'{name}.npy', np.random.randn(n, 4).astype(np.float32))
+    cfg = dict(CFG, source={'type': 'file', 'path': str(tmp_path / '*.npy'), 'speed': 0, 'chunk': 50},
+               sessions={'mode': 'multi'})
+
+    async def run():
+        pipe = Pipeline(FakeRunner(), queue_size=1, lossless=True)
+        pipe.start()
+        sessions = SessionManager(cfg, n_buffers=3, spec_size=(16, 16))
+        sessions.start()
+
+        async def schedule():
+            async for hops in sessions.hops():
+                await pipe.put(hops)
+            await pipe.finish()
+        asyncio.ensure_future(schedule())
+        seen = [(sid, seq) for batch in [b async for b in pipe.results()] for sid, seq, _ in batch]
+        pipe.stop()
+        return sessions, seen
+
+    sessions, seen = asyncio.run(asyncio.wait_for(run(), 60))
+    # First hop after a full window, then every 32 samples to the end of each file
+    for sid, n in (('file:a', 1280), ('file:b', 900)):
+        assert [seq for s, seq in seen if s == sid] == list(range(128, n + 1, 32))
+        assert sessions.sessions[sid].scheduler.dropped == 0
@@ -0,0 +1,47 @@
+# online/tests/test_spectrogram.py
+import numpy as np
+from scipy.ndimage import zoom
+from scipy.signal import stft
+from src.preprocess import Preprocessor, extract_feats
+from src.spectrogram import IncrementalSTFT, resize_spec, stft_shape
+
+
+def test_incremental_stft_matches_scipy():
+    fs, win, hop = 256, 256, 64
+    data = np.random.randn(win + 10 * hop, 8) * 3 + 1
+    pre = Preprocessor(fs, 1, 45, window=win)
+    engine = IncrementalSTFT(fs, win)
+    pre.update(data[:win])
+    seq = win
+    for start in range(win, data.shape[0], hop):
+        window = pre.update(data[start:start + hop]).T
+        seq += hop
+        spec = engine.compute(window, seq, pre.mean, pre.std)
+        _, _, Z = stft(window, fs, nperseg=fs // 2, noverlap=fs // 4)
+        ref = np.log1p(np.abs(Z)).mean(axis=0)
+        assert spec.shape == ref.shape
+        assert np.allclose(spec, ref, atol=1e-10)
+    assert engine.hits > 0
+
+
+def test_resize_spec_matches_zoom():
+    spec = np.random.rand(65, 5)
+    out = np.empty((3, 224, 224), dtype=np.float32)
+    res = resize_spec(spec, out)
+    ref = zoom(spec, (224 / 65, 224 / 5), order=1)
+    assert res is out
+    for plane in res:
+        assert np.allclose(plane, ref, atol=1e-6)
+
+
+def test_native_single_channel_spec():
+    fs, n = 256, 1280
+    window = np.random.randn(8, n)
+    spec1, de1 = extract_feats(window, fs, channels=1, size=None)
+    spec3, de3 = extract_feats(window, fs)
+    _, _, Z = stft(window, fs, nperseg=fs // 2, noverlap=fs // 4)
+    ref = np.log1p(np.abs(Z)).mean(axis=0)
+    assert spec1.shape == (1,) + stft_shape(fs, n) == (1,) + ref.shape
+    assert np.allclose(spec1[0], ref, atol=1e-6)
+    assert np.allclose(spec3[0], zoom(ref, (224 / ref.shape[0], 224 / ref.shape[1]), order=1), atol=1e-6)
+    assert np.array_equal(de1, de3)
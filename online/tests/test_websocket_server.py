@@ -0,0 +1,120 @@
+# online/tests/test_websocket_server.py
+import asyncio
+import json
+import socket
+import websockets
+from src import wire
+from src.websocket_server import WebSocketServer
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_frontend_link_reconnects_and_drops_oldest():
+    port = _free_port()
+    received = []
+
+    async def frontend(websocket):
+        async for message in websocket:
+            received.append(json.loads(message))
+
+    async def run():
+        ws = WebSocketServer("127.0.0.1", 0, frontend_uri=f"ws://127.0.0.1:{port}/ws",
+                             frontend_queue=3, reconnect_min=0.01, reconnect_max=0.05)
+        ws.start_frontend()
+        # Dashboard is down: sends return immediately, only the newest frames are kept
+        for i in range(5):
+            ws.send_to_frontend({'valence': float(i), 'arousal': 0.0, 'session_id': 's'})
+        await asyncio.sleep(0.1)
+        assert not ws.frontend_connected and ws.frontend_dropped == 2
+        async with websockets.serve(frontend, "127.0.0.1", port):
+            for _ in range(100):
+                if len(received) == 3:
+                    break
+                await asyncio.sleep(0.02)
+            assert ws.frontend_connected
+            ws.send_to_frontend({'valence': 9.0, 'arousal': 0.0})
+            await asyncio.sleep(0.1)
+        ws.stop_frontend()
+
+    asyncio.run(run())
+    assert [m['payload']['valence'] for m in received] == [2.0, 3.0, 4.0, 9.0]
+    assert received[-1]['payload']['sessionId'] == 'live_session'
+
+
+class FakeSocket:
+    def __init__(self, name, stalled=False):
+        self.remote_address = (name, 0)
+        self.received = []
+        self.stalled = stalled
+        self.closed = asyncio.Event()
+        self.close_code = None
+
+    async def send(self, data):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.received.append(json.loads(data))
+
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
+        self.closed.set()
+
+    async def wait_closed(self):
+        await self.closed.wait()
+
+
+def _fan_out(slow_clients):
+    async def run():
+        ws = WebSocketServer("127.0.0.1", 0, frontend_uri="", max_lag=5, slow_clients=slow_clients)
+        fast, slow = FakeSocket("fast"), FakeSocket("slow", stalled=True)
+        handlers = [asyncio.ensure_future(ws.handler(s, "/ws")) for s in (fast, slow)]
+        await asyncio.sleep(0)
+        for i in range(10):
+            await ws.broadcast({'i': i})
+            await asyncio.sleep(0)
+        stats = {s['remote']: s for s in ws.client_stats()}
+        fast.closed.set()
+        slow.closed.set()
+        await asyncio.gather(*handlers)
+        return ws, fast, slow, stats
+    return asyncio.run(run())
+
+
+def test_broadcast_does_not_wait_for_slow_client():
+    ws, fast, slow, stats = _fan_out("downsample")
+    assert [m['i'] for m in fast.received] == list(range(10))
+    slow_stats = stats[str(slow.remote_address)]
+    assert slow_stats['lag'] == 10 and slow_stats['dropped'] == 8
+    assert stats[str(fast.remote_address)]['lag'] == 0
+    assert ws.evicted == 0 and not ws.clients
+
+
+def test_slow_client_is_evicted():
+    ws, fast, slow, stats = _fan_out("evict")
+    assert len(fast.received) == 10
+    assert ws.evicted == 1 and slow.close_code == 1013
+    assert list(stats) == [str(fast.remote_address)]
+
+
+def test_clients_negotiate_binary_frames():
+    port = _free_port()
+    result = {'ts': 1.5, 'valence': 0.5, 'arousal': -0.25, 'version': 'v', 'session_id': 's'}
+
+    async def run():
+        ws = WebSocketServer("127.0.0.1", port, frontend_uri="")
+        async with ws.start():
+            uri = f"ws://127.0.0.1:{port}/ws"
+            async with websockets.connect(uri) as text, \
+                    websockets.connect(uri, subprotocols=[wire.SUBPROTOCOL]) as sub, \
+                    websockets.connect(uri + "?format=binary") as query:
+                while len(ws.clients) < 3:
+                    await asyncio.sleep(0.01)
+                await ws.broadcast(result)
+                return [await c.recv() for c in (text, sub, query)]
+
+    text, sub, query = asyncio.run(run())
+    assert json.loads(text) == result
+    assert sub == query and wire.decode(sub)['valence'] == 0.5
@@ -0,0 +1,24 @@
+# online/tests/test_wire.py
+import json
+import numpy as np
+from src import wire
+
+
+def test_binary_frame_roundtrip():
+    result = {'ts': 1760000000.123456, 'valence': 0.25, 'arousal': -0.5,
+              'version': 'va-regressor@1.3.0', 'session_id': 'hs0-受试者'}
+    msg = wire.Message(result)
+    frame = msg.binary
+    assert msg.binary is frame                      # encoded once
+    assert len(frame) < len(msg.json) / 2
+    out = wire.decode(frame)
+    assert out['ts'] == result['ts'] and out['session_id'] == result['session_id']
+    assert np.isclose(out['valence'], 0.25) and np.isclose(out['arousal'], -0.5)
+    assert out['version_id'] == wire.version_id('va-regressor@1.3.0')
+    assert json.loads(msg.encoded(wire.JSON)) == result
+
+
+def test_long_session_id_truncated_to_whole_characters():
+    result = {'ts': 0.0, 'valence': 0.0, 'arousal': 0.0, 'session_id': 'é' * 128}
+    out = wire.decode(wire.encode(result))
+    assert out['session_id'] == 'é' * 127             # 254 bytes, not half a character